@@ -0,0 +1,91 @@
+"""
+AST Skeleton Cache
+Content-addressed cache for parsed pipeline skeletons
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import sys
+
+CACHE_DIR = ".mermaid-gen-cache"
+# Bump when the skeleton output format changes so stale entries miss
+SCHEMA_VERSION = 1
+_KEY_SUFFIX = f"-py{sys.version_info[0]}.{sys.version_info[1]}-v{SCHEMA_VERSION}"
+
+
+def _cache_path(content: str, variant: str) -> str:
+    key = hashlib.sha256(f"{variant}\0{content}".encode('utf-8')).hexdigest()
+    # Shard by the first hash byte: one flat directory degrades listing and
+    # lookup once a large repo has pushed thousands of entries into it
+    return os.path.join(CACHE_DIR, key[:2], f"{key}{_KEY_SUFFIX}.pkl")
+
+
+def get_or_parse(content: str, parse_func, variant: str = "") -> str:
+    """
+    Return the cached skeleton for this exact source text, or parse and cache it
+
+    Args:
+        content: Raw source text (its sha256 is the cache key)
+        parse_func: Zero-argument callable that produces the skeleton on a miss
+        variant: Extra key material for options that change the output
+                 (e.g. comment extraction)
+
+    Returns:
+        The skeleton string
+    """
+    cache_file = _cache_path(content, variant)
+    try:
+        with open(cache_file, 'rb') as f:
+            return pickle.load(f)
+    except (OSError, pickle.PickleError, EOFError):
+        pass
+
+    skeleton = parse_func()
+
+    # Best-effort write: a read-only checkout just runs uncached.
+    # The temp-file + os.replace dance keeps concurrent readers from ever
+    # seeing a partially written entry.
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        tmp_file = f"{cache_file}.tmp.{os.getpid()}"
+        with open(tmp_file, 'wb') as f:
+            pickle.dump(skeleton, f)
+        os.replace(tmp_file, cache_file)
+    except OSError:
+        pass
+
+    return skeleton
+
+
+_PREVIEW_INDEX_FILE = "preview-index.json"
+
+
+def load_preview_index() -> dict:
+    """
+    Load the non-Python preview index: 'files' maps absolute path to
+    {mtime_ns, sha} and 'snippets' maps sha to the cached head text, so
+    identical boilerplate files share one stored snippet
+    """
+    try:
+        with open(os.path.join(CACHE_DIR, _PREVIEW_INDEX_FILE), 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        if index.get('version') == SCHEMA_VERSION:
+            return index
+    except (OSError, ValueError):
+        pass
+    return {'version': SCHEMA_VERSION, 'files': {}, 'snippets': {}}
+
+
+def save_preview_index(index: dict) -> None:
+    """Persist the preview index; best-effort and atomic like the skeletons"""
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        index_file = os.path.join(CACHE_DIR, _PREVIEW_INDEX_FILE)
+        tmp_file = f"{index_file}.tmp.{os.getpid()}"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+        os.replace(tmp_file, index_file)
+    except OSError:
+        pass
@@ -3,47 +3,113 @@ Change Mapper
 Maps code changes from git diff to diagram nodes
 """
 
+import bisect
 import re
-from typing import Dict, List, Set, Tuple
+import sys
+from typing import Dict, FrozenSet, List, Set, Tuple
 from mermaid_parser import MermaidDiagram
 
 
+# Precompiled patterns (compiled once at import instead of per call).
+# One alternation with named groups so diff text is scanned in a single pass;
+# the matched group name is the affected step type.
+_DIFF_TEXT_RE = re.compile(
+    r'(?P<chunking>chunk_(?:size|overlap)\s*=\s*\d+)'
+    r'|(?P<embedding>model\s*=\s*["\'][^"\']+["\'])'
+    r'|(?P<vectordb>namespace\s*=\s*["\'][^"\']+["\'])'
+    r'|(?P<storage>bucket\s*=\s*["\'][^"\']+["\'])',
+    re.IGNORECASE
+)
+
+# Single combined pattern so parse_git_diff_output scans the diff text once
+# instead of once per fact kind
+_DIFF_COMBO_RE = re.compile(
+    r'diff --git a/(?P<file>.*?) b/'
+    r'|[-+]\s*def\s+(?P<func>\w+)\s*\('
+    r'''|[-+]\s*(?P<ck>\w+)\s*=\s*(?P<cv>\d+|["'][^"']+["'])'''
+)
+
+
 class ChangeMapper:
     """Maps code changes to diagram nodes that need updating"""
-    
-    # Keywords that indicate specific pipeline steps
+
+    # Keywords that indicate specific pipeline steps. Normalized once at
+    # class load: lowercased frozensets for C-level membership tests, and
+    # interned step names so dict lookups compare by identity.
     STEP_KEYWORDS = {
-        'chunking': ['chunk', 'split', 'textsplitter', 'chunk_size', 'chunk_overlap'],
-        'embedding': ['embedding', 'embed', 'openai', 'model', 'text-embedding'],
-        'storage': ['bucket', 'gcs', 'storage', 'upload', 'download'],
-        'cache': ['pickle', 'pkl', 'cache', 'dump', 'load'],
-        'vectordb': ['pinecone', 'turbopuffer', 'weaviate', 'upsert', 'namespace', 'index'],
-        'database': ['firestore', 'mongodb', 'collection', 'document'],
-        'ingestion': ['ingest', 'read', 'load', 'source', 'input'],
-        'processing': ['process', 'transform', 'parse'],
+        sys.intern(step): frozenset(map(str.lower, keywords))
+        for step, keywords in {
+            'chunking': ['chunk', 'split', 'textsplitter', 'chunk_size', 'chunk_overlap'],
+            'embedding': ['embedding', 'embed', 'openai', 'model', 'text-embedding'],
+            'storage': ['bucket', 'gcs', 'storage', 'upload', 'download'],
+            'cache': ['pickle', 'pkl', 'cache', 'dump', 'load'],
+            'vectordb': ['pinecone', 'turbopuffer', 'weaviate', 'upsert', 'namespace', 'index'],
+            'database': ['firestore', 'mongodb', 'collection', 'document'],
+            'ingestion': ['ingest', 'read', 'load', 'source', 'input'],
+            'processing': ['process', 'transform', 'parse'],
+        }.items()
     }
-    
+
     def __init__(self, diagram: MermaidDiagram):
         self.diagram = diagram
         self.node_keywords = self._build_node_keyword_map()
+
+        # Inverted index: keyword/step_type -> node IDs, built once so
+        # _find_nodes_by_step_type is a dict lookup instead of a full rescan
+        self._step_to_nodes: Dict[str, List[str]] = {}
+        for node_id, keywords in self.node_keywords.items():
+            for keyword in keywords:
+                self._step_to_nodes.setdefault(keyword, []).append(node_id)
+
+        # Subgraph-name matches per step type, precomputed the same way
+        # (subgraph names lowercased once for the fallback scan)
+        self._subgraphs_lower = [
+            (subgraph_name.lower(), node_ids)
+            for subgraph_name, node_ids in self.diagram.subgraphs.items()
+        ]
+        self._subgraph_step_nodes: Dict[str, List[str]] = {}
+        for step_type in self.STEP_KEYWORDS:
+            nodes = []
+            for subgraph_lower, node_ids in self._subgraphs_lower:
+                if step_type in subgraph_lower:
+                    nodes.extend(node_ids)
+            self._subgraph_step_nodes[step_type] = nodes
+
+        # Node IDs paired with their lowercased form, so the suggested-node
+        # substring matching never re-lowers ids per change
+        self._node_ids_lower: List[Tuple[str, str]] = [
+            (node_id, node_id.lower()) for node_id in self.diagram.nodes
+        ]
+
+        # Memoized results of _find_nodes_by_step_type
+        self._step_lookup_cache: Dict[str, FrozenSet[str]] = {}
+
+        # Edge adjacency, so get_node_context avoids scanning every edge
+        self._incoming: Dict[str, List[str]] = {}
+        self._outgoing: Dict[str, List[str]] = {}
+        for src, dst in self.diagram.edges:
+            self._outgoing.setdefault(src, []).append(dst)
+            self._incoming.setdefault(dst, []).append(src)
     
-    def _build_node_keyword_map(self) -> Dict[str, Set[str]]:
-        """Build a map of node_id -> set of keywords found in that node"""
+    def _build_node_keyword_map(self) -> Dict[str, FrozenSet[str]]:
+        """Build a map of node_id -> frozenset of keywords found in that node"""
         node_keywords = {}
-        
+
         for node_id, node_data in self.diagram.nodes.items():
             content = node_data.get('content', '').lower()
-            keywords = set()
-            
-            # Extract keywords from content
-            for step_type, step_keywords in self.STEP_KEYWORDS.items():
-                for keyword in step_keywords:
-                    if keyword in content:
-                        keywords.add(keyword)
-                        keywords.add(step_type)
-            
-            node_keywords[node_id] = keywords
-        
+
+            # Extract keywords from content with a single regex scan
+            # (the lookahead keeps overlapping hits like 'load' in 'upload')
+            found = set(_KEYWORD_RE.findall(content))
+            for keyword in list(found):
+                found.update(_KEYWORD_SUBSTRINGS[keyword])
+
+            # Frozen: the map is read-only after construction, and frozensets
+            # hash/compare without the mutable-set overhead
+            node_keywords[node_id] = frozenset(
+                found | {step for k in found for step in _KEYWORD_TO_STEP[k]}
+            )
+
         return node_keywords
     
     def map_changes_to_nodes(self, diff_data: Dict) -> List[str]:
@@ -97,10 +163,10 @@ class ChangeMapper:
             # Strategy 1: Use LLM-suggested affected nodes
             if 'affected_nodes' in change:
                 for suggested_node in change['affected_nodes']:
-                    # Try to find matching node IDs
+                    # Try to find matching node IDs (ids lowercased once at init)
                     suggested_lower = suggested_node.lower()
-                    for node_id in self.diagram.nodes.keys():
-                        if suggested_lower in node_id.lower() or node_id.lower() in suggested_lower:
+                    for node_id, node_id_lower in self._node_ids_lower:
+                        if suggested_lower in node_id_lower or node_id_lower in suggested_lower:
                             affected_nodes.add(node_id)
             
             # Strategy 2: Map by component name
@@ -112,9 +178,14 @@ class ChangeMapper:
             # Strategy 3: Map by field name
             field = change.get('field', '').lower()
             if field:
-                for node_id, keywords in self.node_keywords.items():
-                    if field in keywords or any(kw in field for kw in keywords):
-                        affected_nodes.add(node_id)
+                # Scan the field once for known terms, then resolve each hit
+                # through the inverted index
+                terms = set(_FIELD_TERM_RE.findall(field))
+                for term in list(terms):
+                    terms.update(_FIELD_TERM_SUBSTRINGS[term])
+                terms.add(field)
+                for term in terms:
+                    affected_nodes.update(self._step_to_nodes.get(term, ()))
         
         return affected_nodes
     
@@ -133,22 +204,17 @@ class ChangeMapper:
         # Strategy 1: Map by file name
         for file_path in diff_data.get('changed_files', []):
             file_name = file_path.split('/')[-1].lower()
-            
-            # Extract keywords from filename
-            for step_type, keywords in self.STEP_KEYWORDS.items():
-                if any(kw in file_name for kw in keywords):
-                    # Find nodes related to this step
-                    nodes = self._find_nodes_by_step_type(step_type)
-                    affected_nodes.update(nodes)
-        
+
+            # Find steps whose keywords occur in the filename (single scan)
+            for step_type in _match_step_types(file_name):
+                nodes = self._find_nodes_by_step_type(step_type)
+                affected_nodes.update(nodes)
+
         # Strategy 2: Map by function names
         for func_name in diff_data.get('changed_functions', []):
-            func_lower = func_name.lower()
-            
-            for step_type, keywords in self.STEP_KEYWORDS.items():
-                if any(kw in func_lower for kw in keywords):
-                    nodes = self._find_nodes_by_step_type(step_type)
-                    affected_nodes.update(nodes)
+            for step_type in _match_step_types(func_name.lower()):
+                nodes = self._find_nodes_by_step_type(step_type)
+                affected_nodes.update(nodes)
         
         # Strategy 3: Map by config changes
         for config_key in diff_data.get('changed_configs', {}).keys():
@@ -166,39 +232,42 @@ class ChangeMapper:
         
         return affected_nodes
     
-    def _find_nodes_by_step_type(self, step_type: str) -> List[str]:
-        """Find all nodes related to a specific step type"""
-        matching_nodes = []
-        
-        for node_id, keywords in self.node_keywords.items():
-            if step_type in keywords:
-                matching_nodes.append(node_id)
-        
+    def _find_nodes_by_step_type(self, step_type: str) -> FrozenSet[str]:
+        """Find all nodes related to a specific step type (memoized)"""
+        cached = self._step_lookup_cache.get(step_type)
+        if cached is not None:
+            return cached
+
+        matching_nodes = set(self._step_to_nodes.get(step_type, ()))
+
         # Also check subgraph names
-        for subgraph_name, node_ids in self.diagram.subgraphs.items():
-            if step_type.lower() in subgraph_name.lower():
-                matching_nodes.extend(node_ids)
-        
-        return list(set(matching_nodes))
+        subgraph_nodes = self._subgraph_step_nodes.get(step_type)
+        if subgraph_nodes is None:
+            # Step type outside STEP_KEYWORDS: fall back to a direct scan
+            step_lower = step_type.lower()
+            subgraph_nodes = [
+                node_id
+                for subgraph_lower, node_ids in self._subgraphs_lower
+                if step_lower in subgraph_lower
+                for node_id in node_ids
+            ]
+        matching_nodes.update(subgraph_nodes)
+
+        result = frozenset(matching_nodes)
+        self._step_lookup_cache[step_type] = result
+        return result
     
     def _analyze_diff_text(self, diff_text: str) -> Set[str]:
         """Analyze raw diff text to find affected nodes"""
         affected = set()
-        
-        # Look for specific config changes
-        patterns = {
-            r'chunk_size\s*=\s*(\d+)': 'chunking',
-            r'chunk_overlap\s*=\s*(\d+)': 'chunking',
-            r'model\s*=\s*["\']([^"\']+)["\']': 'embedding',
-            r'namespace\s*=\s*["\']([^"\']+)["\']': 'vectordb',
-            r'bucket\s*=\s*["\']([^"\']+)["\']': 'storage',
-        }
-        
-        for pattern, step_type in patterns.items():
-            if re.search(pattern, diff_text, re.IGNORECASE):
-                nodes = self._find_nodes_by_step_type(step_type)
-                affected.update(nodes)
-        
+
+        # Look for specific config changes - one pass, the group name of each
+        # match is the step type
+        step_types = {m.lastgroup for m in _DIFF_TEXT_RE.finditer(diff_text)}
+        for step_type in step_types:
+            nodes = self._find_nodes_by_step_type(step_type)
+            affected.update(nodes)
+
         return affected
     
     def get_node_context(self, node_id: str) -> Dict:
@@ -208,9 +277,9 @@ class ChangeMapper:
         
         node = self.diagram.nodes[node_id]
         
-        # Find incoming and outgoing edges
-        incoming = [src for src, dst in self.diagram.edges if dst == node_id]
-        outgoing = [dst for src, dst in self.diagram.edges if src == node_id]
+        # Find incoming and outgoing edges (precomputed adjacency)
+        incoming = self._incoming.get(node_id, [])
+        outgoing = self._outgoing.get(node_id, [])
         
         return {
             'node_id': node_id,
@@ -223,6 +292,44 @@ class ChangeMapper:
         }
 
 
+# Flattened keyword -> step_types lookup plus a single alternation regex so a
+# node's content is scanned once instead of probed per keyword. Longest
+# keywords first so 'chunk_size' wins over 'chunk' at the same position;
+# _KEYWORD_SUBSTRINGS restores the shorter keywords a longer match implies.
+# A keyword can belong to several step types ('load' is both cache and
+# ingestion), so the values are frozensets.
+_KEYWORD_TO_STEP = {
+    kw: frozenset(step for step, kws in ChangeMapper.STEP_KEYWORDS.items() if kw in kws)
+    for kws in ChangeMapper.STEP_KEYWORDS.values() for kw in kws
+}
+_KEYWORD_RE = re.compile(
+    '(?=({}))'.format('|'.join(sorted(map(re.escape, _KEYWORD_TO_STEP), key=len, reverse=True))),
+    re.IGNORECASE
+)
+_KEYWORD_SUBSTRINGS = {
+    kw: frozenset(other for other in _KEYWORD_TO_STEP if other != kw and other in kw)
+    for kw in _KEYWORD_TO_STEP
+}
+
+
+def _match_step_types(text: str) -> Set[str]:
+    """Find all step types whose keywords occur in text with one regex scan"""
+    return {step for kw in _KEYWORD_RE.findall(text) for step in _KEYWORD_TO_STEP[kw]}
+
+
+# Terms used for field matching: keywords plus the step-type names, since node
+# keyword sets contain both
+_FIELD_TERMS = set(_KEYWORD_TO_STEP) | set(ChangeMapper.STEP_KEYWORDS)
+_FIELD_TERM_RE = re.compile(
+    '(?=({}))'.format('|'.join(sorted(map(re.escape, _FIELD_TERMS), key=len, reverse=True))),
+    re.IGNORECASE
+)
+_FIELD_TERM_SUBSTRINGS = {
+    term: frozenset(other for other in _FIELD_TERMS if other != term and other in term)
+    for term in _FIELD_TERMS
+}
+
+
 def parse_git_diff_output(diff_output: str) -> Dict:
     """
     Parse git diff output into structured format
@@ -240,30 +347,31 @@ def parse_git_diff_output(diff_output: str) -> Dict:
         'diff_text': diff_output
     }
     
-    # Extract changed files
-    file_pattern = r'diff --git a/(.*?) b/'
-    files = re.findall(file_pattern, diff_output)
-    result['changed_files'] = files
-    
-    # Extract function definitions that changed
-    func_pattern = r'[-+]\s*def\s+(\w+)\s*\('
-    functions = re.findall(func_pattern, diff_output)
-    result['changed_functions'] = list(set(functions))
-    
-    # Extract config changes (key=value patterns)
-    config_patterns = [
-        r'[-+]\s*(\w+)\s*=\s*(\d+)',  # numeric configs
-        r'[-+]\s*(\w+)\s*=\s*["\']([^"\']+)["\']',  # string configs
-    ]
-    
-    for pattern in config_patterns:
-        matches = re.findall(pattern, diff_output)
-        for key, value in matches:
-            result['changed_configs'][key] = value
-    
+    # Extract files, changed function definitions and key=value config
+    # changes in a single scan over the diff text
+    functions = set()
+    for match in _DIFF_COMBO_RE.finditer(diff_output):
+        kind = match.lastgroup
+        if kind == 'file':
+            result['changed_files'].append(match.group('file'))
+        elif kind == 'func':
+            functions.add(match.group('func'))
+        else:
+            value = match.group('cv')
+            if not value.isdigit():
+                value = value[1:-1]  # strip the quotes
+            result['changed_configs'][match.group('ck')] = value
+    result['changed_functions'] = list(functions)
+
     return result
 
 
+# Impact buckets for calculate_change_impact; bisect picks the level for a
+# given percentage
+_IMPACT_THRESHOLDS = (20, 50, 80)
+_IMPACT_LEVELS = ('low', 'medium', 'high', 'full')
+
+
 def calculate_change_impact(affected_nodes: List[str], total_nodes: int) -> Tuple[str, float]:
     """
     Calculate the impact level of changes
@@ -278,19 +386,12 @@ def calculate_change_impact(affected_nodes: List[str], total_nodes: int) -> Tupl
     """
     if total_nodes == 0:
         return 'full', 100.0
-    
-    percentage = (len(affected_nodes) / total_nodes) * 100
-    
-    if percentage == 0:
+    if not affected_nodes:
         return 'none', 0.0
-    elif percentage < 20:
-        return 'low', percentage
-    elif percentage < 50:
-        return 'medium', percentage
-    elif percentage < 80:
-        return 'high', percentage
-    else:
-        return 'full', percentage
+
+    percentage = (len(affected_nodes) / total_nodes) * 100
+    level = _IMPACT_LEVELS[bisect.bisect(_IMPACT_THRESHOLDS, percentage)]
+    return level, percentage
 
 
 if __name__ == "__main__":
@@ -1,7 +1,10 @@
 import os
+import shutil
 import subprocess
 import re
 import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 
 # Configuration
 # Using raw strings for Windows paths
@@ -12,21 +15,50 @@ PIPELINES = [
 TOOL_SCRIPT = "main.py"
 PYTHON_CMD = sys.executable
 
+# Precompiled patterns (compiled once at import instead of per call)
+_MERMAID_DIV_OPEN = '<div class="mermaid">'
+_MERMAID_NODE_RE = re.compile(r'\w+\s*[\[\(\{\<].*?[\]\)\}\>]')
+_README_STEP_RE = re.compile(r'^\s*\d+\.\s+', re.MULTILINE)
+_CONTEXT_SIZE_RE = re.compile(r'Total context size: (\d+) characters')
+
+# Load .env once at import so each subprocess launch reuses the same overlay
+_ENV_OVERLAY = {}
+if os.path.exists(".env"):
+    with open(".env", "r") as _f:
+        for _line in _f:
+            _line = _line.strip()
+            if _line and not _line.startswith("#") and "=" in _line:
+                _k, _v = _line.split("=", 1)
+                _ENV_OVERLAY[_k] = _v
+
 def count_tokens(text):
     # Approximation: 1 token ~= 4 characters
     return len(text) / 4
 
+def _iter_py_sizes(directory):
+    # scandir yields DirEntry objects whose type and stat come from the
+    # directory read itself - no extra stat/join per file like os.walk
+    try:
+        entries = os.scandir(directory)
+    except OSError:
+        return
+    with entries:
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    # Skip hidden dirs and virtualenvs - not pipeline source
+                    if entry.name.startswith('.') or 'venv' in entry.name:
+                        continue
+                    yield from _iter_py_sizes(entry.path)
+                elif entry.name.endswith('.py'):
+                    # File size is enough for the approximation (bytes == chars
+                    # for ASCII-dominant source)
+                    yield entry.stat().st_size
+            except OSError:
+                continue
+
 def get_raw_code_token_count(directory):
-    total_chars = 0
-    for root, _, files in os.walk(directory):
-        for file in files:
-            if file.endswith('.py'):
-                try:
-                    with open(os.path.join(root, file), 'r', encoding='utf-8') as f:
-                        total_chars += len(f.read())
-                except:
-                    pass
-    return count_tokens(" " * total_chars)
+    return sum(_iter_py_sizes(directory)) / 4
 
 def parse_mermaid_steps(html_path):
     if not os.path.exists(html_path):
@@ -34,12 +66,17 @@ def parse_mermaid_steps(html_path):
     try:
         with open(html_path, 'r', encoding='utf-8') as f:
             content = f.read()
-        match = re.search(r'<div class="mermaid">\s*(.*?)\s*</div>', content, re.DOTALL)
-        if match:
-            mermaid_code = match.group(1)
+        # Literal find/slice beats a DOTALL regex over the whole HTML file
+        start = content.find(_MERMAID_DIV_OPEN)
+        if start != -1:
+            start += len(_MERMAID_DIV_OPEN)
+            end = content.find('</div>', start)
+            if end == -1:
+                end = len(content)
+            mermaid_code = content[start:end].strip()
             # Count nodes: Look for identifiers followed by brackets/parens
             # e.g. A[Text], B(Text), C{Text}
-            nodes = re.findall(r'\w+\s*[\[\(\{\<].*?[\]\)\}\>]', mermaid_code)
+            nodes = _MERMAID_NODE_RE.findall(mermaid_code)
             return len(nodes)
     except Exception as e:
         print(f"Error parsing mermaid: {e}")
@@ -55,7 +92,7 @@ def parse_readme_steps(directory):
     
     # Heuristic: Count numbered list items (1. Step)
     # We look for lines starting with a number and a dot
-    steps = re.findall(r'^\s*\d+\.\s+', content, re.MULTILINE)
+    steps = _README_STEP_RE.findall(content)
     return len(steps)
 
 def evaluate_pipeline(pipeline_path):
@@ -64,51 +101,59 @@ def evaluate_pipeline(pipeline_path):
     
     # 1. Run the tool
     # We assume .env is loaded by the subprocess or we pass env vars
-    cmd = [PYTHON_CMD, TOOL_SCRIPT, pipeline_path, "--debug", "--include-comments"]
-    
-    # Load .env manually to ensure subprocess gets it
-    env = os.environ.copy()
-    if os.path.exists(".env"):
-        with open(".env", "r") as f:
-            for line in f:
-                line = line.strip()
-                if line and not line.startswith("#") and "=" in line:
-                    k, v = line.split("=", 1)
-                    env[k] = v
-    
-    try:
-        result = subprocess.run(cmd, capture_output=True, text=True, env=env)
-        if result.returncode != 0:
-            print(f"Tool failed for {pipeline_name}: {result.stderr}")
-            # Continue anyway to see if we can salvage metrics
-    except Exception as e:
-        print(f"Execution error: {e}")
-        return None
-
-    # 2. Analyze AST Debug Output (Tool Usage)
-    ast_file = "ast_debug_output.txt"
-    tool_token_count = 0
-    if os.path.exists(ast_file):
-        with open(ast_file, 'r', encoding='utf-8') as f:
-            content = f.read()
-            # Extract "Total context size: X characters"
-            match = re.search(r'Total context size: (\d+) characters', content)
-            if match:
-                tool_token_count = int(match.group(1)) / 4
-            else:
-                tool_token_count = count_tokens(content)
-        
-        # Rename debug output to keep it
-        os.rename(ast_file, f"ast_debug_{pipeline_name}.txt")
-
-    # 3. Analyze Raw Code (Baseline)
-    raw_token_count = get_raw_code_token_count(pipeline_path)
-    
-    # 4. Analyze Result (Diagram)
-    diagram_file = "diagram.html"
-    diagram_steps = parse_mermaid_steps(diagram_file)
-    if os.path.exists(diagram_file):
-        os.rename(diagram_file, f"diagram_{pipeline_name}.html")
+    # Absolute path so the tool can be launched from a per-pipeline cwd
+    cmd = [PYTHON_CMD, os.path.abspath(TOOL_SCRIPT), pipeline_path, "--debug", "--include-comments"]
+
+    # .env is parsed once at module load; merge it over the current environment
+    env = {**os.environ, **_ENV_OVERLAY}
+
+    # Each pipeline gets its own scratch cwd so the tool's fixed output
+    # filenames (ast_debug_output.txt, diagram.html) can't collide when
+    # several evaluations run concurrently
+    with tempfile.TemporaryDirectory(prefix=f"eval_{pipeline_name}_") as workdir:
+        try:
+            # Only stderr matters (for the failure message) - discard stdout and
+            # detach stdin so no extra pipes get set up
+            result = subprocess.run(
+                cmd,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+                stdin=subprocess.DEVNULL,
+                text=True,
+                env=env,
+                cwd=workdir
+            )
+            if result.returncode != 0:
+                print(f"Tool failed for {pipeline_name}: {result.stderr}")
+                # Continue anyway to see if we can salvage metrics
+        except Exception as e:
+            print(f"Execution error: {e}")
+            return None
+
+        # 2. Analyze AST Debug Output (Tool Usage)
+        ast_file = os.path.join(workdir, "ast_debug_output.txt")
+        tool_token_count = 0
+        if os.path.exists(ast_file):
+            with open(ast_file, 'r', encoding='utf-8') as f:
+                content = f.read()
+                # Extract "Total context size: X characters"
+                match = _CONTEXT_SIZE_RE.search(content)
+                if match:
+                    tool_token_count = int(match.group(1)) / 4
+                else:
+                    tool_token_count = count_tokens(content)
+
+            # Move debug output out of the scratch dir to keep it
+            shutil.move(ast_file, f"ast_debug_{pipeline_name}.txt")
+
+        # 3. Analyze Raw Code (Baseline)
+        raw_token_count = get_raw_code_token_count(pipeline_path)
+
+        # 4. Analyze Result (Diagram)
+        diagram_file = os.path.join(workdir, "diagram.html")
+        diagram_steps = parse_mermaid_steps(diagram_file)
+        if os.path.exists(diagram_file):
+            shutil.move(diagram_file, f"diagram_{pipeline_name}.html")
     
     # 5. Analyze README (Ground Truth Proxy)
     readme_steps = parse_readme_steps(pipeline_path)
@@ -123,14 +168,19 @@ def evaluate_pipeline(pipeline_path):
     }
 
 def main():
-    results = []
+    existing = []
     for p in PIPELINES:
         if os.path.exists(p):
-            res = evaluate_pipeline(p)
-            if res:
-                results.append(res)
+            existing.append(p)
         else:
             print(f"Pipeline path not found: {p}")
+
+    results = []
+    if existing:
+        # Pipelines are independent (own scratch cwd each), so evaluate them
+        # in parallel worker processes
+        with ProcessPoolExecutor(max_workers=len(existing)) as executor:
+            results = [r for r in executor.map(evaluate_pipeline, existing) if r]
             
     print("\n" + "="*95)
     print(f"{'Pipeline':<25} | {'Raw Tok':<10} | {'Tool Tok':<10} | {'Saved':<8} | {'README Steps':<12} | {'Diagram Nodes':<12}")
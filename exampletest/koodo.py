@@ -1,7 +1,16 @@
 import requests
+from requests.adapters import HTTPAdapter, Retry
+import aiohttp
+import asyncio
+import hashlib
 import json
+import orjson
 import time
 import markdownify
+import numpy as np
+import tiktoken
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
 # import pickle
 import os
 import sys
@@ -11,7 +20,7 @@ from datetime import datetime, timezone
 
 from google.cloud import firestore
 from langchain.docstore.document import Document
-from langchain.text_splitter import RecursiveCharacterTextSplitter, MarkdownHeaderTextSplitter
+from langchain.text_splitter import MarkdownHeaderTextSplitter
 
 # add src for local imports
 absolute_path = os.path.dirname(__file__)
@@ -42,6 +51,20 @@ webhook_url = os.getenv("ALERT_WEBHOOK_URL")
 # db = firestore.Client(project=project_id)
 firestore_db = firestore.Client(project=project_id)
 
+# Secrets and endpoints resolved once at import: Config.fetch can be a
+# secret-manager RPC per call, and several keys are needed more than once
+KOODO_TOKEN_URL = Config.fetch('koodo-api-token-url')
+EN_CLIENT_ID = Config.fetch('en-koodo-client-id')
+EN_CLIENT_SECRET = Config.fetch('en-koodo-client-secret')
+FR_CLIENT_ID = Config.fetch('fr-koodo-client-id')
+FR_CLIENT_SECRET = Config.fetch('fr-koodo-client-secret')
+KOODO_ARTICLES_URL = Config.fetch('koodo-api-articles-url')
+COMMERCE_API_USERNAME = Config.fetch('koodo-commerce-api-username')
+COMMERCE_API_PASSWORD = Config.fetch('koodo-commerce-api-password')
+LITELLM_PROXY_KEY = Config.fetch('litellm-proxy-key-aia-koodo')
+AIA_CLIENT_ID = Config.fetch('aia-client-id')
+TPUF_FIRESTORE_COLLECTION = Config.fetch('turbopuffer-client-id-firestore-collection')
+
 # Start time of the first task
 start_time = time.time()
 start_time_string = datetime.utcfromtimestamp(start_time).strftime("%Y-%m-%d %H:%M:%S")
@@ -49,46 +72,102 @@ run_date = datetime.now(timezone.utc).strftime("%Y-%m-%d")
 
 
 # Get OAuth2 access token for API request
-def get_access_token(client_id, client_secret):
-    response = requests.post(
-        Config.fetch('koodo-api-token-url'),
+async def _get_access_token_async(session, client_id, client_secret):
+    async with session.post(
+        KOODO_TOKEN_URL,
         data={"grant_type": "client_credentials", "scope": "read"},
-        auth=(client_id, client_secret),
-        # proxies={'http': os.getenv('HTTP_PROXY'), 'https': os.getenv('HTTPS_PROXY')}
+        auth=aiohttp.BasicAuth(client_id, client_secret),
+    ) as response:
+        body = orjson.loads(await response.read())
+        return body['access_token']
+
+# Startup requests: both OAuth tokens and the help-articles payload are
+# independent, so their round-trips are overlapped in one session
+async def _bootstrap_async(source_server_url):
+    async with _make_session() as session:
+        async def fetch_help_articles():
+            async with session.get(source_server_url) as response:
+                return orjson.loads(await response.read())
+
+        return await asyncio.gather(
+            _get_access_token_async(session, EN_CLIENT_ID, EN_CLIENT_SECRET),
+            _get_access_token_async(session, FR_CLIENT_ID, FR_CLIENT_SECRET),
+            fetch_help_articles(),
+        )
+
+# Shared session for the synchronous call sites: keep-alive reuses the TCP/TLS
+# connection across requests to the same host instead of re-handshaking
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=32,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504]),
+))
+
+# Concurrency settings for the async fetch helpers
+PAGE_WINDOW = 10  # pages fetched speculatively per gather round
+FETCH_CONCURRENCY = 10
+
+def _make_session():
+    # One connector per session: pooled connections + cached DNS across requests
+    return aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=20, ttl_dns_cache=300)
     )
-    return response.json()['access_token']
 
-# make a GET request to get community articles
-def get_articles(access_token, url):
+# make concurrent GET requests to get community articles
+async def _get_articles_async(session, access_token, url):
+    semaphore = asyncio.Semaphore(FETCH_CONCURRENCY)
+    headers = {"Authorization": f"Bearer {access_token}"}
+
+    async def fetch_page(page):
+        async with semaphore:
+            async with session.get(url, params={"page": page, "pageSize": 100}, headers=headers) as response:
+                body = orjson.loads(await response.read())
+                return body['result']
+
+    # Sliding window: fetch pages [page, page+PAGE_WINDOW) concurrently and
+    # stop at the first empty page, discarding the speculative tail
     articles = []
     page = 1
-    pageSize = 100
     while True:
-        response = requests.get(
-            url,
-            params={"page": page, "pageSize": pageSize},
-            headers={"Authorization": f"Bearer {access_token}"},
-            # proxies={'http': os.getenv('HTTP_PROXY'), 'https': os.getenv('HTTPS_PROXY')}
-        )
-        articles.extend(response.json()['result'])
-        if response.json()['result'] == []:
-            break
-        else:
-            page += 1
-    return articles
+        window = await asyncio.gather(*(fetch_page(p) for p in range(page, page + PAGE_WINDOW)))
+        for result in window:
+            if not result:
+                return articles
+            articles.extend(result)
+        page += PAGE_WINDOW
+
+def get_articles(access_token, url):
+    async def run():
+        async with _make_session() as session:
+            return await _get_articles_async(session, access_token, url)
+    return asyncio.run(run())
 
 #GET request for koodo commerce
-def get_koodo_commerce_and_marketing(language, url):
-    response = requests.get(
-            f"{url}lang={language}",
-            auth=(Config.fetch('koodo-commerce-api-username'), Config.fetch('koodo-commerce-api-password')),
-        )
+async def _get_koodo_commerce_and_marketing_async(session, language, url):
+    auth = aiohttp.BasicAuth(COMMERCE_API_USERNAME, COMMERCE_API_PASSWORD)
+    async with session.get(f"{url}lang={language}", auth=auth) as response:
+        body = orjson.loads(await response.read())
+        return body['data']
+
+def get_koodo_commerce_and_marketing(pairs):
+    # Fetch every (language, url) combination concurrently in one session;
+    # results come back in the same order as pairs
+    async def run():
+        async with _make_session() as session:
+            return await asyncio.gather(
+                *(_get_koodo_commerce_and_marketing_async(session, lang, url) for lang, url in pairs)
+            )
+    return asyncio.run(run())
 
-    return response.json()['data']
+# Module-level so ProcessPoolExecutor can pickle it for the worker processes
+def _md_worker(raw_content):
+    # removed .replace('\n\n', ' ') as recursive splitter uses that as a seperator
+    return markdownify.markdownify(raw_content.replace('_', '').strip(), heading_style="ATX", strip=['img'])
 
 # get all content categories
 def get_categories(access_token, url):
-    response = requests.get(
+    response = SESSION.get(
         url,
         headers={"Authorization": f"Bearer {access_token}"},
         # proxies={'http': os.getenv('HTTP_PROXY'), 'https': os.getenv('HTTPS_PROXY')}
@@ -98,11 +177,15 @@ def get_categories(access_token, url):
 
 try:
     source_server_url = 'https://www.koodomobile.com/static/help/api/articles'
-    # get help articles
-    response = requests.get(source_server_url)
-    koodo = response.json()
+    # get both access tokens and the help articles concurrently
+    en_token, fr_token, koodo = asyncio.run(_bootstrap_async(source_server_url))
+    # Single pass: route each article to tagged/untagged without the
+    # intermediate None-filtering comprehension
+    tagged_articles = []
     untagged_articles = []
-    koodo = [art for art in [article if "articleCategory" in article.keys() else untagged_articles.append(article) for article in koodo['data']] if art is not None]
+    for article in koodo['data']:
+        (tagged_articles if "articleCategory" in article else untagged_articles).append(article)
+    koodo = tagged_articles
     print(f"Number of Koodo Articles: {len(koodo)}")
     
     print(f"metadata keys: {koodo[0].keys()}")
@@ -119,44 +202,67 @@ try:
     "https://staging.www.koodomobile.com/api/commerce-postpaid/gen-ai/watches?"
 ]
     dict_map = {"en":urls_to_iterate, "fr":urls_to_iterate}
+    lang_url_pairs = [(lang, url) for lang, urls in dict_map.items() for url in urls]
     commerce_and_marketing_data = []
-    for lang, urls in dict_map.items():
-        for url in urls:
-            comm_data = get_koodo_commerce_and_marketing(lang, url)
-            print(f"Fetched {len(comm_data)} items from {url} in {lang} language.")
-            commerce_and_marketing_data.extend(comm_data)
+    # All 8 language/url fetches run concurrently instead of back-to-back
+    for (lang, url), comm_data in zip(lang_url_pairs, get_koodo_commerce_and_marketing(lang_url_pairs)):
+        print(f"Fetched {len(comm_data)} items from {url} in {lang} language.")
+        commerce_and_marketing_data.extend(comm_data)
     print(f"Total commerce and marketing data fetched: {len(commerce_and_marketing_data)}")
 
 
-    en_token = get_access_token(Config.fetch('en-koodo-client-id'), Config.fetch('en-koodo-client-secret'))
-    fr_token = get_access_token(Config.fetch('fr-koodo-client-id'), Config.fetch('fr-koodo-client-secret'))
-
-    # get community articles
-    en_articles = get_articles(en_token, Config.fetch('koodo-api-articles-url'))
-    fr_articles = get_articles(fr_token, Config.fetch('koodo-api-articles-url'))
+    # get community articles (tokens were fetched during bootstrap)
+    en_articles = get_articles(en_token, KOODO_ARTICLES_URL)
+    fr_articles = get_articles(fr_token, KOODO_ARTICLES_URL)
     # en_categories = get_categories(en_token, Config.fetch('koodo-api-categories-url'))
     # fr_categories = get_categories(fr_token, Config.fetch('koodo-api-categories-url'))
 
     # print community articles that don't have moderator tags
     # english
-    en_articles_without_mod_tag = [article for article in en_articles if article['moderatorTags'] == [] and article['status'] == 'published' and 'mobile-masters-group' not in article['seoCommunityUrl']]
+    en_articles_without_mod_tag = [article for article in en_articles if not article['moderatorTags'] and article['status'] == 'published' and 'mobile-masters-group' not in article['seoCommunityUrl']]
     print(f"number of community EN articles without a moderator tag: {len(en_articles_without_mod_tag)}")
     print(f"community EN articles without a moderator tag: {[article['title'] for article in en_articles_without_mod_tag]}")
     # french
-    fr_articles_without_mod_tag = [article for article in fr_articles if article['moderatorTags'] == [] and article['status'] == 'published']
+    fr_articles_without_mod_tag = [article for article in fr_articles if not article['moderatorTags'] and article['status'] == 'published']
     print(f"number of community FR articles without a moderator tag: {len(fr_articles_without_mod_tag)}")
     print(f"community FR articles without a moderator tag: {[article['title'] for article in fr_articles_without_mod_tag]}")
 
     # exclude articles that are not published or are part of the mobile masters group and don't have moderator tags
-    en_articles = [article for article in en_articles if article['moderatorTags'] != [] and article['status'] == 'published' and 'mobile-masters-group' not in article['seoCommunityUrl']]
-    fr_articles = [article for article in fr_articles if article['moderatorTags'] != [] and article['status'] == 'published']
+    en_articles = [article for article in en_articles if article['moderatorTags'] and article['status'] == 'published' and 'mobile-masters-group' not in article['seoCommunityUrl']]
+    fr_articles = [article for article in fr_articles if article['moderatorTags'] and article['status'] == 'published']
 
     print(f"Number of English documents: {len(en_articles)}")
     print(f"Number of French documents: {len(fr_articles)}")
 
+    # Load the previous run's pickle up front: besides the embeddings it
+    # carries the markdown cache used below
+    pkl_file = get_pickle_from_gcs(project_id, bucket_name, pkl_file_name)
+
+    # Markdownify is the most CPU-expensive step per document, and on
+    # steady-state runs most raw content is unchanged. Key the previous
+    # run's markdown by source and reuse it whenever the sha1 of the raw
+    # content still matches, skipping the BS4-backed parse entirely.
+    prev_markdown = pkl_file.get('markdown_by_source', {}) if pkl_file is not None else {}
+    prev_content_sha1 = pkl_file.get('content_sha1_by_source', {}) if pkl_file is not None else {}
+    markdown_by_source = {}
+    content_sha1_by_source = {}
+    pending_markdown = []  # (doc index, source, raw content) for cache misses
+
+    def to_markdown(source, raw_content):
+        # Cache hit returns the stored markdown; a miss queues the doc for
+        # the parallel conversion pass below and leaves page_content empty
+        digest = hashlib.sha1(raw_content.encode()).digest()
+        content_sha1_by_source[source] = digest
+        if prev_content_sha1.get(source) == digest and source in prev_markdown:
+            markdown = prev_markdown[source]
+            markdown_by_source[source] = markdown
+            return markdown
+        pending_markdown.append((len(langchain_docs), source, raw_content))
+        return ""
+
     # Help Articles
     langchain_docs = []
-    exclude_content = set(["https://www.koodomobile.com/en/help/motorola-one-5g-ace-gift-with-purchase-faqs","https://www.koodomobile.com/fr/help/motorola-one-5g-ace-gift-with-purchase-faqs",
+    exclude_content = frozenset(["https://www.koodomobile.com/en/help/motorola-one-5g-ace-gift-with-purchase-faqs","https://www.koodomobile.com/fr/help/motorola-one-5g-ace-gift-with-purchase-faqs",
             "https://www.koodomobile.com/en/help/ccts",
             "https://www.koodomobile.com/fr/help/ccts",
             "https://community.koodomobile.com/online-orders-232909/when-is-my-order-going-to-arrive-7808174",
@@ -183,8 +289,7 @@ try:
        
         langchain_docs.append(
             Document(
-                # removed .replace('\n\n', ' ') as recursive splitter uses that as a seperator
-                page_content = markdownify.markdownify(d['content'].replace('_', '').strip(),  heading_style="ATX", strip = ['img'] ),
+                page_content = to_markdown(d['url'], d['content']),
                 metadata = {
                     "page_title": d['title'],
                     "source": d['url'],
@@ -195,43 +300,59 @@ try:
             )
         )
 
-    # Community Articles
+    # Community Articles (url prefixes hoisted; source is built once per doc)
+    COMMUNITY_EN = "https://community.koodomobile.com"
+    COMMUNITY_FR = "https://communaute.koodomobile.com"
     for d in en_articles:
-        if "https://community.koodomobile.com" + d['seoCommunityUrl'] in exclude_content:
-            print(f"Skipping community article: https://community.koodomobile.com{d['seoCommunityUrl']}")
+        source = COMMUNITY_EN + d['seoCommunityUrl']
+        if source in exclude_content:
+            print(f"Skipping community article: {source}")
             continue
 
         langchain_docs.append(
             Document(
-                # removed .replace('\n\n', ' ') as recursive splitter uses that as a seperator
-                page_content = markdownify.markdownify(d['content'].replace('_', '').strip(),  heading_style="ATX", strip = ['img'] ),
+                page_content = to_markdown(source, d['content']),
                 metadata = {
                     "page_title": d['title'],
-                    "source": "https://community.koodomobile.com" + d['seoCommunityUrl'],
-                    "category": list(map(str.lower, d['moderatorTags'])),
+                    "source": source,
+                    "category": [t.lower() for t in d['moderatorTags']],
                     "language": "en",
                 }
             )
         )
 
     for d in fr_articles:
-        if "https://communaute.koodomobile.com" + d['seoCommunityUrl'] in exclude_content:
-            print(f"Skipping article: https://communaute.koodomobile.com{d['seoCommunityUrl']}")
+        source = COMMUNITY_FR + d['seoCommunityUrl']
+        if source in exclude_content:
+            print(f"Skipping article: {source}")
             continue
 
         langchain_docs.append(
             Document(
-                # removed .replace('\n\n', ' ') as recursive splitter uses that as a seperator
-                page_content = markdownify.markdownify(d['content'].replace('_', '').strip(),  heading_style="ATX", strip = ['img'] ),
+                page_content = to_markdown(source, d['content']),
                 metadata = {
                     "page_title": d['title'],
-                    "source": "https://communaute.koodomobile.com" + d['seoCommunityUrl'],
-                    "category": list(map(str.lower, d['moderatorTags'])),
+                    "source": source,
+                    "category": [t.lower() for t in d['moderatorTags']],
                     "language": "fr",
                 }
             )
         )
 
+    # Convert the cache misses across CPU cores: markdownify is pure-Python
+    # CPU work with no shared state, so it maps cleanly onto processes.
+    # Fork explicitly: this script runs its whole pipeline at import time,
+    # so spawn/forkserver workers re-importing the module would re-run the
+    # entire ETL recursively
+    if pending_markdown:
+        print(f"Markdownifying {len(pending_markdown)} changed documents in parallel")
+        with ProcessPoolExecutor(max_workers=os.cpu_count(),
+                                 mp_context=multiprocessing.get_context("fork")) as executor:
+            converted = executor.map(_md_worker, [raw for _, _, raw in pending_markdown], chunksize=16)
+            for (doc_index, source, _), markdown in zip(pending_markdown, converted):
+                langchain_docs[doc_index].page_content = markdown
+                markdown_by_source[source] = markdown
+
     # Append commerce and Marketing pages
     for comm_data in commerce_and_marketing_data:
         page_content = comm_data['content']
@@ -248,10 +369,13 @@ try:
                 )
     print(f"Number of commerce and marketing documents added to the langchain docs: {len(commerce_and_marketing_data)}")
 
-    # Go through all documents, combine page content and metadata into a single JSON and upload to GCS
-    final_json_list = [{ "page_content": doc.page_content, "metadata": doc.metadata } for doc in langchain_docs]
+    # Go through all documents, combine page content and metadata into a single JSON and upload to GCS.
+    # Kept as a list: json.dump cannot serialize a generator and the uploader
+    # owns the serialization. The dicts only reference the existing content
+    # strings, so this is small per record rather than a second copy.
+    final_json_records = [{ "page_content": doc.page_content, "metadata": doc.metadata } for doc in langchain_docs]
     filepath = f"{api_env}/src_json_combined/{application_name}_source_data_{run_date}.json"
-    upload_json_file_combined_data(project_id, bucket_name, final_json_list, filepath)
+    upload_json_file_combined_data(project_id, bucket_name, final_json_records, filepath)
     logging.info("Uploaded combined source data JSON to GCS")
 
     # Create source chunks from the documents
@@ -261,57 +385,82 @@ try:
         # ("###", "Header 3"),
     ]
     markdown_splitter = MarkdownHeaderTextSplitter(headers_to_split_on=headers_to_split_on, strip_headers=False)
-    md_header_splits = markdown_splitter.split_text([(doc.page_content) for doc in  langchain_docs][0])
 
     markdown_docs = []
-    count = 0
-    for doc_num in range(len(langchain_docs)):
-        md_header_splits = markdown_splitter.split_text(langchain_docs[doc_num].page_content)
+    for doc in langchain_docs:
+        md_header_splits = markdown_splitter.split_text(doc.page_content)
+        meta = doc.metadata
         for md_doc in md_header_splits:
-            md_doc.metadata = langchain_docs[doc_num].metadata
-        count+=1
-        markdown_docs+=md_header_splits
-
-    recursive_text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-        chunk_size=1200,
-        chunk_overlap=100,
-        encoding_name="cl100k_base"
-    )
+            md_doc.metadata = meta
+        markdown_docs.extend(md_header_splits)
+
+    doc_count = len(langchain_docs)
+    # The full corpus is never read again once markdown_docs exists and the
+    # JSON upload above has run; free it before the memory-heavy embedding step
+    del langchain_docs
 
     # recursive_text_splitter = RecursiveCharacterTextSplitter(
     #     chunk_size = 1500,
     #     chunk_overlap  = 50,
     #     length_function = len,
     # )
-    print(f"Number of documents: {len(langchain_docs)}")
+    print(f"Number of documents: {doc_count}")
     print(f"Number of markdown documents: {len(markdown_docs)}")
-    md_source_chunks_token = recursive_text_splitter.split_documents(markdown_docs)
+
+    # Tokenize every markdown doc in one encode_batch call - tiktoken runs the
+    # batch on its internal threadpool - then cut chunks by token index. The
+    # header-aware splitting already happened above, so plain 1200-token
+    # windows with 100-token overlap replace the per-decision re-encoding that
+    # RecursiveCharacterTextSplitter.from_tiktoken_encoder performs
+    CHUNK_TOKENS = 1200
+    CHUNK_OVERLAP = 100
+    enc = tiktoken.get_encoding("cl100k_base")
+    token_lists = enc.encode_batch(
+        [doc.page_content for doc in markdown_docs],
+        num_threads=os.cpu_count()
+    )
+    md_source_chunks_token = []
+    for doc, tokens in zip(markdown_docs, token_lists):
+        if len(tokens) <= CHUNK_TOKENS:
+            md_source_chunks_token.append(doc)
+            continue
+        for start in range(0, len(tokens), CHUNK_TOKENS - CHUNK_OVERLAP):
+            window = tokens[start:start + CHUNK_TOKENS]
+            md_source_chunks_token.append(
+                Document(page_content=enc.decode(window).strip(), metadata=doc.metadata)
+            )
+            if start + CHUNK_TOKENS >= len(tokens):
+                break
     print(f"Number of source chunk tokens: {len(md_source_chunks_token)}")
     md_source_chunks_token_filtered = [d for d in md_source_chunks_token if len(d.page_content) > 10 and len(set(d.page_content)) > 2]
     print(f"Number of source chunk tokens after filtering: {len(md_source_chunks_token_filtered)}")
     loading_time = time.time()
 
-    # Re-create page_content by appending page_title and fields_subTitle to beginning of page_content
-    for doc in md_source_chunks_token_filtered:
-        doc.page_content = f"# {doc.metadata['page_title']}\n\n{doc.page_content}"
-
-    # Convert source chunks to dictionary format for process embeddings method
+    # Re-create page_content by appending page_title to the beginning and
+    # build the dict for process_embeddings in the same pass. setdefault
+    # collapses identical title+body chunks so duplicates never reach the
+    # embedding step twice.
     docs = {}
     for chunk in md_source_chunks_token_filtered:
-        docs[chunk.page_content] = chunk
+        key = f"# {chunk.metadata['page_title']}\n\n{chunk.page_content}"
+        chunk.page_content = key
+        docs.setdefault(key, chunk)
 
     # Get the embedding function
-    embedding_func = get_default_embedding_func(model=embedding_model_name, openai_api_key=Config.fetch("litellm-proxy-key-aia-koodo"))
+    embedding_func = get_default_embedding_func(model=embedding_model_name, openai_api_key=LITELLM_PROXY_KEY)
 
     start_time_embedding = time.time()
 
-    # Load in docs and embeddings from pkl file if it exists:
-    pkl_file = get_pickle_from_gcs(project_id, bucket_name, pkl_file_name)
-
-    # if no pkl file found, generate new embeddings for all documents. If the pkl file is found, load the existing embeddings
+    # if no pkl file found, generate new embeddings for all documents. If the pkl file (loaded above) is found, load the existing embeddings
     if pkl_file is not None:
         logging.info("Pickle file loaded successfully.")
-        embedding_dict = {doc.page_content: embedding for doc, embedding in zip(pkl_file['docs'], pkl_file['embeddings'])}
+        embedding_dict = pkl_file.get('embedding_dict')
+        if embedding_dict is None:
+            # The pickle carries the embeddings once, as the float32 array;
+            # rebuilding the lookup dict here zips doc keys with array rows
+            # (views), so no embedding data is copied. The .get covers
+            # interim pickles that stored the dict alongside the array.
+            embedding_dict = {doc.page_content: embedding for doc, embedding in zip(pkl_file['docs'], pkl_file['embeddings'])}
     else:
         embedding_dict = {} # intialize an empty dictionary to hold document and embedding pairs
         logging.info("Failed to load pickle file or file doesn't exist.")
@@ -323,12 +472,19 @@ try:
 
     # get docs ordered according to new embeddings list for turbopuffer upload
     embedded_chunks_list = [docs[key] for key in new_embeddings_dict.keys()]
-    embeddings_list = list(new_embeddings_dict.values())
-
-    # Write pickle file to GCS
+    # One contiguous float32 array: ~6x smaller in RAM and on disk than a
+    # list of Python-float lists, and turbopuffer takes numeric rows directly
+    embeddings_array = np.asarray(list(new_embeddings_dict.values()), dtype=np.float32)
+
+    # Write pickle file to GCS (markdown cache rides along for the next run).
+    # The float32 array is the only copy of the embeddings; the lookup dict
+    # is rebuilt from docs + array rows on load, so the pickle doesn't carry
+    # every vector a second time as Python floats.
     source_docs = {
         'docs': embedded_chunks_list,
-        'embeddings': embeddings_list
+        'embeddings': embeddings_array,
+        'markdown_by_source': markdown_by_source,
+        'content_sha1_by_source': content_sha1_by_source
     }
 
     logging.info("Finished processing chunks.")
@@ -341,7 +497,6 @@ try:
     del source_docs
     del pkl_file
     del new_embeddings_dict
-    del final_json_list
 
     embedding_time = time.time()
     embedding_duration = int(embedding_time - loading_time)
@@ -349,7 +504,7 @@ try:
 
     index_name += f"-{start_time_string}".replace(":", "-").replace(" ", "-")
 
-    aia_client_id = Config.fetch('aia-client-id')
+    aia_client_id = AIA_CLIENT_ID
     namepace_name = f"{aia_client_id}-{embedding_model_name}-{index_name}"
     # Upload to turbopuffer
     tpuf_helpers = TurbopufferHelpers()
@@ -360,7 +515,7 @@ try:
     tpuf_upload, err = tpuf_helpers.from_documents(
                                         namespace = namepace_name,
                                         documents=embedded_chunks_list, 
-                                        embeddings_list=embeddings_list,
+                                        embeddings_list=embeddings_array,
                                         embedding_model = embedding_model_name
                                     )
 
@@ -403,7 +558,7 @@ try:
         logging.info(f"Deleting previous namespaces: {delete_namespaces}")
         for ns in delete_namespaces: # Delete firestore doc in brain-turbopuffer-namespace-client-id
             tpuf_helpers.delete_namespace(ns)
-            namespace_doc_ref = firestore_db.collection(Config.fetch("turbopuffer-client-id-firestore-collection")).document(ns)
+            namespace_doc_ref = firestore_db.collection(TPUF_FIRESTORE_COLLECTION).document(ns)
             namespace_doc_ref.delete()
 
     # Add to firestore db
@@ -415,7 +570,7 @@ try:
                             "email": "AIA",
                             "embedding_model": embedding_model_name
                         }
-    tpuf_doc_ref = firestore_db.collection(Config.fetch("turbopuffer-client-id-firestore-collection")).document(namepace_name)
+    tpuf_doc_ref = firestore_db.collection(TPUF_FIRESTORE_COLLECTION).document(namepace_name)
     tpuf_doc_ref.set(tpuf_firestore_data)
 
     end_time = time.time()
@@ -427,7 +582,7 @@ try:
         'start_timestamp': start_time_string,
         'end_timestamp': end_time_string,
         'duration_in_seconds': time_taken,
-        'num_embeddings': len(embeddings_list),
+        'num_embeddings': len(embeddings_array),
         'num_new_embeddings': new_embed_count,
         'input_file': source_server_url,
         'output': [{'type': 'turbopuffer', 'name': namepace_name}],
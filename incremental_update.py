@@ -26,13 +26,19 @@ def generate_incremental_prompt(existing_diagram: str, diff_context: str, affect
     """
     affected_nodes_str = ", ".join(affected_nodes) if affected_nodes else "None detected"
     
-    node_details = ""
+    # One formatted block per context, joined once - repeated += on a string
+    # recopies the accumulated text every iteration
+    detail_parts = []
     for ctx in node_contexts:
-        node_details += f"\n  Node {ctx['node_id']}:"
-        node_details += f"\n    - Current Content: {ctx['content'][:150]}..."
-        node_details += f"\n    - Subgraph: {ctx.get('subgraph', 'None')}"
-        node_details += f"\n    - Keywords: {', '.join(ctx.get('keywords', []))}"
-        node_details += f"\n    - Connected to: {', '.join(ctx.get('incoming_nodes', []) + ctx.get('outgoing_nodes', []))}"
+        connected = ctx.get('incoming_nodes', []) + ctx.get('outgoing_nodes', [])
+        detail_parts.append(
+            f"\n  Node {ctx['node_id']}:"
+            f"\n    - Current Content: {ctx['content'][:150]}..."
+            f"\n    - Subgraph: {ctx.get('subgraph', 'None')}"
+            f"\n    - Keywords: {', '.join(ctx.get('keywords', []))}"
+            f"\n    - Connected to: {', '.join(connected)}"
+        )
+    node_details = "".join(detail_parts)
     
     prompt = f"""
     You are updating an EXISTING Mermaid diagram with new code changes.
@@ -122,25 +128,26 @@ def process_incremental_update(path: str, include_comments: bool = False, debug:
     
     print(f"✅ {reason}")
     
+    # Generate diff context first: if there is nothing to apply, bail out
+    # before paying for the diagram read and Mermaid parse
+    diff_output, diff_data = generate_diff_context(path, api_key=api_key)
+
+    if not diff_output:
+        mode_info['fallback_reason'] = "Could not generate diff context"
+        return False, None, mode_info
+
     # Parse existing diagram
     diagram_path = os.path.join(path, "diagram.html")
     existing_mermaid = extract_mermaid_from_html(diagram_path)
-    
+
     if not existing_mermaid:
         mode_info['fallback_reason'] = "Could not parse existing diagram"
         return False, None, mode_info
-    
+
     diagram = parse_mermaid_diagram(existing_mermaid)
-    
+
     print(f"📊 Existing diagram: {len(diagram.nodes)} nodes, {len(diagram.edges)} connections")
     
-    # Generate diff context with semantic parsing
-    diff_output, diff_data = generate_diff_context(path, api_key=api_key)
-    
-    if not diff_output:
-        mode_info['fallback_reason'] = "Could not generate diff context"
-        return False, None, mode_info
-    
     # Map changes to nodes
     mapper = ChangeMapper(diagram)
     affected_nodes = mapper.map_changes_to_nodes(diff_data)
@@ -1,17 +1,34 @@
 import os
+import sys
 import typer
-import openai
-import pathspec
 from pathlib import Path
-import tokenize
-import io
+import functools
+import re
 import subprocess
+import bisect
 import json
+import hashlib
+import mmap
+from concurrent.futures import ProcessPoolExecutor
 from typing import List, Dict, Optional
 
+import cache
+
 app = typer.Typer()
 FUEL_PROXY_URL = "https://api-beta.fuelix.ai"
 
+# Shared connection pool: repeated generations in one process (incremental
+# runs, batch evaluation) reuse the TCP+TLS connection to the proxy instead
+# of paying the handshake RTTs on every call. Built lazily so parse-only
+# runs never import httpx.
+@functools.lru_cache(maxsize=1)
+def _http_client():
+    import httpx
+    return httpx.Client(
+        timeout=60.0,
+        limits=httpx.Limits(max_keepalive_connections=4, max_connections=8),
+    )
+
 import ast
 
 # Entry point detection patterns
@@ -22,129 +39,304 @@ ENTRY_POINT_PATTERNS = {
     'java': ['Main.java', 'App.java', 'Application.java']
 }
 
+def _scan_comment_tokens(source_code: str):
+    """Yield (lineno, raw_comment) pairs without running the full tokenizer
+
+    tokenize tracks indentation, NEWLINE/NL bookkeeping, and f-string
+    lexing we don't need just to pick out comments. This scanner only has
+    to know whether a '#' sits inside a string, so it tracks quote state:
+    triple-quoted blocks across lines, single-quoted strings within one
+    plus backslash line continuations. Backslashes escape quotes even in
+    raw strings for lexing purposes, so one escape rule covers both.
+    """
+    in_triple = None
+    in_single = None
+    for lineno, line in enumerate(source_code.splitlines(), 1):
+        i = 0
+        n = len(line)
+        if in_triple is not None:
+            end = line.find(in_triple)
+            if end == -1:
+                continue
+            i = end + 3
+            in_triple = None
+        elif in_single is not None:
+            # Inside a single-quoted string continued from the previous
+            # line with a trailing backslash; find where it closes
+            j = 0
+            while j < n:
+                c = line[j]
+                if c == '\\':
+                    j += 2
+                    continue
+                if c == in_single:
+                    break
+                j += 1
+            else:
+                # Still open: the tokenizer carries a continued string over
+                # only when the line textually ends with a backslash
+                # (escaped or not); otherwise it abandons the string after
+                # consuming this line rather than swallow the rest of the
+                # file
+                if not line.endswith('\\'):
+                    in_single = None
+                continue
+            i = j + 1
+            in_single = None
+        while i < n:
+            ch = line[i]
+            if ch == '#':
+                yield lineno, line[i:]
+                break
+            if ch == '"' or ch == "'":
+                if line.startswith(ch * 3, i):
+                    end = line.find(ch * 3, i + 3)
+                    if end == -1:
+                        in_triple = ch * 3
+                        break
+                    i = end + 3
+                    continue
+                j = i + 1
+                while j < n:
+                    c = line[j]
+                    if c == '\\':
+                        j += 2
+                        continue
+                    if c == ch:
+                        break
+                    j += 1
+                else:
+                    # Ran off the end: j lands past n only when the final
+                    # character was an escaping backslash, i.e. the string
+                    # continues on the next line. Otherwise the quote never
+                    # closes and the tokenizer treats it as a stray error
+                    # token and keeps lexing right after it - do the same
+                    if j > n:
+                        in_single = ch
+                        break
+                    i += 1
+                    continue
+                i = j + 1
+                continue
+            i += 1
+
+
+# One compiled alternation replaces the startswith/upper()/slice cascade;
+# group order encodes the old precedence (header, then todo, then a STEP
+# anywhere in the first 20 characters)
+_CLASSIFY_RE = re.compile(
+    r'(?i)(?P<header>[=\-])'
+    r'|(?P<todo>TODO|FIXME|HACK|XXX)'
+    r'|(?P<step>.{0,16}?STEP)'
+)
+
 # Comment extraction function
 def extract_comments_with_context(source_code: str) -> List[Dict]:
     """Extract comments with their line numbers and categorize them"""
+    # No '#' anywhere means no comments; one C-level scan skips the
+    # line-by-line lexing entirely for comment-free files
+    if '#' not in source_code:
+        return []
+
     comments = []
-    
-    try:
-        tokens = tokenize.generate_tokens(io.StringIO(source_code).readline)
-        
-        for token in tokens:
-            if token.type == tokenize.COMMENT:
-                comment_text = token.string.strip('#').strip()
-                
-                # Skip empty comments
-                if not comment_text:
-                    continue
-                
-                # Categorize comments
-                if comment_text.startswith('=') or comment_text.startswith('-'):
-                    comment_type = 'section_header'
-                elif comment_text.upper().startswith(('TODO', 'FIXME', 'HACK', 'XXX')):
-                    comment_type = 'todo'  # Skip these
-                elif comment_text.upper().startswith('STEP') or 'STEP' in comment_text.upper()[:20]:
-                    comment_type = 'step_marker'
-                elif len(comment_text) > 100:
-                    comment_type = 'docstring'  # Long explanatory comment
-                else:
-                    comment_type = 'explanation'
-                
-                comments.append({
-                    'line': token.start[0],
-                    'text': comment_text,
-                    'type': comment_type,
-                    'raw': token.string
-                })
-    except:
-        pass
-    
-    return comments
 
-class PipelineVisitor(ast.NodeVisitor):
-    def __init__(self):
-        self.structure = []
-        self.indent_level = 0
+    for line_num, raw in _scan_comment_tokens(source_code):
+        comment_text = raw.strip('#').strip()
 
-    def _indent(self):
-        return "  " * self.indent_level
+        # Skip empty comments
+        if not comment_text:
+            continue
 
-    def visit_Import(self, node):
-        names = [n.name for n in node.names]
-        self.structure.append(f"{self._indent()}IMPORT: {', '.join(names)}")
+        # Categorize comments
+        m = _CLASSIFY_RE.match(comment_text)
+        if m:
+            group = m.lastgroup
+            if group == 'header':
+                comment_type = 'section_header'
+            elif group == 'todo':
+                comment_type = 'todo'  # Skip these
+            else:
+                comment_type = 'step_marker'
+        elif len(comment_text) > 100:
+            comment_type = 'docstring'  # Long explanatory comment
+        else:
+            comment_type = 'explanation'
 
-    def visit_ImportFrom(self, node):
-        names = [n.name for n in node.names]
-        self.structure.append(f"{self._indent()}FROM {node.module} IMPORT: {', '.join(names)}")
+        comments.append({
+            'line': line_num,
+            'text': comment_text,
+            'type': comment_type,
+            'raw': raw
+        })
 
-    def visit_If(self, node):
-        # Extract the condition text roughly
-        condition = ast.unparse(node.test)
-        self.structure.append(f"{self._indent()}IF ({condition}):")
-        self.indent_level += 1
-        self.generic_visit(node)
-        self.indent_level -= 1
+    return comments
 
-    def visit_For(self, node):
-        target = ast.unparse(node.target)
-        iterator = ast.unparse(node.iter)
-        self.structure.append(f"{self._indent()}FOR {target} IN {iterator}:")
-        self.indent_level += 1
-        self.generic_visit(node)
-        self.indent_level -= 1
 
-    def visit_Call(self, node):
-        # This captures function calls like 'log_to_bigquery(...)'
-        try:
-            func_name = ast.unparse(node.func)
-            self.structure.append(f"{self._indent()}CALL: {func_name}(...)")
-        except:
-            pass
+# Config keywords that mark a call's arguments worth keeping in full.
+# One compiled case-insensitive scan replaces lowering the whole arg string
+# and running a Python-level substring loop per assignment.
+_IMPORTANT_RE = re.compile(
+    '(?i)chunk_size|chunk_overlap|model|namespace|index|bucket|path'
+    '|alias|collection|database|pkl|pickle|cache|embedding'
+)
 
-    def visit_Assign(self, node):
-        # Captures 'doc_ref = ...' but ignores the huge dictionary details
-        targets = [ast.unparse(t) for t in node.targets]
-        # We don't recurse into value to avoid printing dictionary bodies
-        # But we do check if the value is a Function Call
-        if isinstance(node.value, ast.Call):
-            func_name = ast.unparse(node.value.func)
-            self.structure.append(f"{self._indent()}SET {'='.join(targets)} = CALL {func_name}(...)")
-        else:
-            self.structure.append(f"{self._indent()}SET {'='.join(targets)} = [Value]")
+# Method/function names that identify a logging call structurally, before
+# any rendering of the func expression
+_LOG_METHODS = frozenset({'info', 'debug', 'warning', 'error', 'exception',
+                          'critical', 'log', 'print'})
+_LOG_NAMES = frozenset({'print', 'log'})
 
-    def visit_FunctionDef(self, node):
-        # In case there are helper functions defined
-        self.structure.append(f"{self._indent()}DEF {node.name}(args):")
-        self.indent_level += 1
-        self.generic_visit(node)
-        self.indent_level -= 1
+def _name_of(node):
+    """
+    Render the common expression shapes (names, attribute chains, constants)
+    by direct attribute reads; ast.unparse builds a full Unparser and walks
+    the subtree, which is overkill for these and is kept only as fallback.
+    """
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        # Only chase bases that render without parentheses; anything else
+        # ((a if c else b).append, (x + y).real) needs unparse's precedence
+        # handling to stay faithful
+        if isinstance(node.value, (ast.Name, ast.Attribute)):
+            return f"{_name_of(node.value)}.{node.attr}"
+        return ast.unparse(node)
+    if isinstance(node, ast.Constant):
+        return repr(node.value)
+    return ast.unparse(node)
 
-import ast
+class SemanticVisitor:
+    # Annotated so the class compiles cleanly under mypyc, whose static
+    # attribute access is a good fit for this dispatch-heavy hot path
+    structure: List[tuple]
+    indent_level: int
+    comments: List[Dict]
+    last_line: int
 
-class SemanticVisitor(ast.NodeVisitor):
     def __init__(self, comments: List[Dict] = None):
         self.structure = []
+        self._unparse_cache = {}
+        self.reset(comments)
+
+    def reset(self, comments: List[Dict] = None) -> None:
+        """Prepare the visitor for another file
+
+        Ingestion walks thousands of files through one visitor per process;
+        clearing in place reuses the list and dict capacity grown on earlier
+        files instead of reallocating them each time.
+        """
+        self.structure.clear()
         self.indent_level = 0
         self.comments = comments or []
+        # Extraction yields comments in line order, so a parallel line list
+        # lets binding bisect instead of rescanning every comment per node
+        self._comment_lines = [c['line'] for c in self.comments]
         self.last_line = 0
+        self._unparse_cache.clear()
+
+    # Indent strings are two-space multiples of a small level; prebuild them
+    # so rendering indexes a tuple instead of allocating a string per line
+    _INDENTS = tuple("  " * i for i in range(64))
+
+    def _emit(self, text: str) -> None:
+        """Record one skeleton line; indentation is applied at render time
+
+        Storing (level, text) tuples defers the indent concatenation to the
+        single render pass, so traversal allocates one tuple per line
+        instead of a second formatted string.
+        """
+        self.structure.append((self.indent_level, text))
+
+    def render(self) -> str:
+        """Join the recorded lines into the final skeleton"""
+        indents = self._INDENTS
+        return "\n".join(
+            (indents[level] if level < 64 else "  " * level) + text
+            for level, text in self.structure
+        )
+
+    def _unparse(self, node) -> str:
+        """ast.unparse memoized on node identity for the current pass
+
+        The same subtree can reach the unparser more than once (an If test
+        re-walked by the DFS, shared condition nodes); keyed by id() the
+        second rendering is a dict hit. The cache dies with the visitor, so
+        ids can't be recycled under it.
+        """
+        key = id(node)
+        result = self._unparse_cache.get(key)
+        if result is None:
+            result = ast.unparse(node)
+            self._unparse_cache[key] = result
+        return result
+
+    def _name(self, node) -> str:
+        """_name_of with the same per-pass memoization as _unparse
+
+        Assignment targets and call funcs recur across emissions (the same
+        attribute chain referenced by several statements shares subtrees
+        only per statement, but one statement can render a node twice), so
+        repeated renderings collapse to a dict hit.
+        """
+        key = id(node)
+        result = self._unparse_cache.get(key)
+        if result is None:
+            result = _name_of(node)
+            self._unparse_cache[key] = result
+        return result
+
+    # Filled in below the class body once the handlers exist
+    _DISPATCH = {}
+
+    def visit(self, root):
+        """
+        Iterative DFS replacing NodeVisitor's recursion: a dict lookup per
+        node instead of getattr('visit_...') plus a Python frame per level.
+        Handlers return True when their children should be visited one
+        indent level deeper; a (node, True) marker on the stack closes that
+        level on the way back out. Node types without a handler are
+        descended through at the current indent.
+
+        Only statement children are descended into: every node we summarize
+        is a statement (bare calls arrive wrapped in ast.Expr), so walking
+        the expression subtrees of conditions and arguments is pure waste.
+        """
+        dispatch = self._DISPATCH
+        stack = [(root, False)]
+        while stack:
+            node, post = stack.pop()
+            if post:
+                self.indent_level -= 1
+                continue
+            handler = dispatch.get(type(node))
+            if handler is not None:
+                if not handler(self, node):
+                    continue
+                stack.append((node, True))
+            # Reversed so the first child is popped first
+            stack.extend(
+                (child, False)
+                for child in reversed([c for c in ast.iter_child_nodes(node)
+                                       if isinstance(c, ast.stmt)])
+            )
+
+    def _iter_call_args(self, call):
+        """Yield rendered call arguments one at a time, positional first"""
+        for a in call.args:
+            yield self._name(a)
+        for kw in call.keywords:
+            yield f"{kw.arg}={self._name(kw.value)}"
 
-    def _indent(self):
-        return "  " * self.indent_level
-    
     def _get_comments_before_line(self, line_num: int) -> List[Dict]:
         """Get comments that appear before this line"""
-        relevant_comments = []
-        
-        # Look for comments within 2 lines before this code
-        for comment in self.comments:
-            if self.last_line < comment['line'] <= line_num:
-                # Comment is between last processed line and current line
-                if line_num - comment['line'] <= 2:  # Within 2 lines
-                    # Skip TODO comments
-                    if comment['type'] != 'todo':
-                        relevant_comments.append(comment)
-        
-        return relevant_comments
+        # Eligible lines fall in (max(last_line, line_num - 3), line_num]:
+        # between the last processed statement and this one, within 2 lines.
+        # Two bisects bound that window instead of scanning every comment.
+        lines = self._comment_lines
+        lo = bisect.bisect_right(lines, max(self.last_line, line_num - 3))
+        hi = bisect.bisect_right(lines, line_num, lo)
+        # Skip TODO comments
+        return [c for c in self.comments[lo:hi] if c['type'] != 'todo']
     
     def _format_comment(self, comment: Dict) -> str:
         """Format comment for output"""
@@ -159,6 +351,13 @@ class SemanticVisitor(ast.NodeVisitor):
         else:
             return f"  # {comment['text']}"
 
+    def visit_Expr(self, node):
+        # Statement-expression wrapper: a bare call like upload(...) is the
+        # only expression statement worth summarizing
+        if isinstance(node.value, ast.Call):
+            self.visit_Call(node.value)
+        return False
+
     def visit_Import(self, node):
         # We can skip imports now, they clutter the logic flow
         pass
@@ -171,68 +370,71 @@ class SemanticVisitor(ast.NodeVisitor):
         if hasattr(node, 'lineno'):
             comments = self._get_comments_before_line(node.lineno)
             for comment in comments:
-                self.structure.append(self._format_comment(comment))
-        
-        condition = ast.unparse(node.test)
-        self.structure.append(f"{self._indent()}IF CHECK: {condition}")
+                self.structure.append((0, self._format_comment(comment)))
         
+        condition = self._unparse(node.test)
+        self._emit(f"IF CHECK: {condition}")
+
         if hasattr(node, 'lineno'):
             self.last_line = node.lineno
-        
+
         self.indent_level += 1
-        self.generic_visit(node)
-        self.indent_level -= 1
+        return True
 
     def visit_Assign(self, node):
         # Get comments before this assignment
         if hasattr(node, 'lineno'):
             comments = self._get_comments_before_line(node.lineno)
             for comment in comments:
-                self.structure.append(self._format_comment(comment))
+                self.structure.append((0, self._format_comment(comment)))
         
-        targets = [ast.unparse(t) for t in node.targets]
+        targets = [self._name(t) for t in node.targets]
         # logic to capture important data transformations
         if isinstance(node.value, ast.Call):
-            func_name = ast.unparse(node.value.func)
-            
-            # Capture both positional and keyword arguments with their values
-            args = []
-            for a in node.value.args:
-                args.append(ast.unparse(a))
-            
-            # Capture keyword arguments (these often contain config!)
-            kwargs = []
-            for kw in node.value.keywords:
-                key = kw.arg
-                value = ast.unparse(kw.value)
-                kwargs.append(f"{key}={value}")
-            
-            # Combine args and kwargs
-            all_args = args + kwargs
+            func_name = self._name(node.value.func)
+
+            # Cheap signal first: keyword names flag most config calls
+            # without rendering a single value
+            important = any(kw.arg and _IMPORTANT_RE.search(kw.arg) for kw in node.value.keywords)
+
+            # Render positional then keyword arguments, checking each piece
+            # as it's produced. Once we're past the truncation budget with no
+            # config keyword in sight, the rest would be cut anyway - stop
+            # rendering it.
+            all_args = []
+            arg_len = 0
+            truncated = False
+            for piece in self._iter_call_args(node.value):
+                if not important and _IMPORTANT_RE.search(piece):
+                    important = True
+                if all_args:
+                    arg_len += 2  # ", " separator
+                all_args.append(piece)
+                arg_len += len(piece)
+                if not important and arg_len > 50:
+                    truncated = True
+                    break
             arg_str = ", ".join(all_args)
-            
-            # Don't truncate if it contains important config keywords
-            important_keywords = ['chunk_size', 'chunk_overlap', 'model', 'namespace', 'index', 'bucket', 'path', 
-                                 'alias', 'collection', 'database', 'pkl', 'pickle', 'cache', 'embedding']
-            if any(kw in arg_str.lower() for kw in important_keywords):
+
+            if important:
                 # Keep full args for config-heavy calls
-                self.structure.append(f"{self._indent()}CONFIG: {'='.join(targets)} = {func_name}({arg_str})")
+                self._emit(f"CONFIG: {'='.join(targets)} = {func_name}({arg_str})")
             else:
                 # Truncate for non-config calls
-                if len(arg_str) > 50: 
+                if truncated or len(arg_str) > 50:
                     arg_str = arg_str[:50] + "..."
-                self.structure.append(f"{self._indent()}ASSIGN: {'='.join(targets)} = CALL {func_name}({arg_str})")
+                self._emit(f"ASSIGN: {'='.join(targets)} = CALL {func_name}({arg_str})")
         
         # Capture Dict creations (Config/Data objects)
         elif isinstance(node.value, ast.Dict):
-            keys = [ast.unparse(k) for k in node.value.keys if k]
-            self.structure.append(f"{self._indent()}DATA_STRUCT: {'='.join(targets)} = Keys[{', '.join(keys)}]")
+            keys = [self._name(k) for k in node.value.keys if k]
+            self._emit(f"DATA_STRUCT: {'='.join(targets)} = Keys[{', '.join(keys)}]")
         
         # Capture constant assignments (like model names, paths)
         elif isinstance(node.value, ast.Constant):
             value = node.value.value
             if isinstance(value, str) and len(value) < 100:
-                self.structure.append(f"{self._indent()}CONSTANT: {'='.join(targets)} = \"{value}\"")
+                self._emit(f"CONSTANT: {'='.join(targets)} = \"{value}\"")
         
         # Update last processed line
         if hasattr(node, 'lineno'):
@@ -243,45 +445,78 @@ class SemanticVisitor(ast.NodeVisitor):
         if hasattr(node, 'lineno'):
             comments = self._get_comments_before_line(node.lineno)
             for comment in comments:
-                self.structure.append(self._format_comment(comment))
+                self.structure.append((0, self._format_comment(comment)))
         
         # This is the most important part: Capturing Logging and External Calls
-        func_name = ast.unparse(node.func)
-        
+        # Logging calls are common enough to deserve a structural fast path:
+        # the method/function name alone identifies them without rendering
+        # the whole func expression
+        func = node.func
+        is_log = (
+            (isinstance(func, ast.Attribute) and func.attr in _LOG_METHODS)
+            or (isinstance(func, ast.Name) and func.id in _LOG_NAMES)
+        )
+        if not is_log:
+            func_name = self._name(func)
+            is_log = "log" in func_name or "print" in func_name
+
         # If it's a logging call, it usually describes the "Step"
-        if "log" in func_name or "print" in func_name:
+        if is_log:
             if node.args and isinstance(node.args[0], ast.Constant):
                 # This captures: logging.info("Finished processing chunks")
-                self.structure.append(f"{self._indent()}LOG_EVENT: \"{node.args[0].value}\"")
+                self._emit(f"LOG_EVENT: \"{node.args[0].value}\"")
             return
 
         # If it's a major operation (upload, download, split)
-        args = [ast.unparse(a) for a in node.args]
+        args = [self._name(a) for a in node.args]
         arg_str = ", ".join(args)
         if len(arg_str) > 50: arg_str = arg_str[:50] + "..."
         
-        self.structure.append(f"{self._indent()}ACTION: {func_name}({arg_str})")
+        self._emit(f"ACTION: {func_name}({arg_str})")
 
     def visit_FunctionDef(self, node):
-        self.structure.append(f"{self._indent()}DEF FUNCTION {node.name}:")
+        self._emit(f"DEF FUNCTION {node.name}:")
+        # Past three levels the skeleton stops adding signal - record the
+        # definition but don't walk its body
+        if self.indent_level >= 3:
+            return False
         self.indent_level += 1
-        self.generic_visit(node)
-        self.indent_level -= 1
+        return True
+
+SemanticVisitor._DISPATCH = {
+    ast.Expr: SemanticVisitor.visit_Expr,
+    ast.Import: SemanticVisitor.visit_Import,
+    ast.ImportFrom: SemanticVisitor.visit_ImportFrom,
+    ast.If: SemanticVisitor.visit_If,
+    ast.Assign: SemanticVisitor.visit_Assign,
+    ast.Call: SemanticVisitor.visit_Call,
+    ast.FunctionDef: SemanticVisitor.visit_FunctionDef,
+}
+
+# One visitor per process, reset between files: ingestion runs this over
+# every Python file in the repo and the reused containers keep their
+# capacity across calls
+_VISITOR = SemanticVisitor()
 
-def parse_pipeline_script(file_content, include_comments=False):
+def parse_pipeline_script(file_content, include_comments=False, filename='<pipeline>'):
     try:
         # Extract comments if requested
         comments = []
         if include_comments:
             comments = extract_comments_with_context(file_content)
-        
-        tree = ast.parse(file_content)
-        visitor = SemanticVisitor(comments=comments)
+
+        # filename shows up in the SyntaxError, which ends up in the skeleton.
+        # Pinning feature_version skips the grammar-compatibility branches,
+        # and we never read type comments
+        tree = ast.parse(file_content, filename=filename, type_comments=False,
+                         feature_version=sys.version_info[:2])
+        visitor = _VISITOR
+        visitor.reset(comments)
         # Iterate over top-level nodes
         for node in tree.body:
             visitor.visit(node)
-        return "\n".join(visitor.structure)
-    except Exception as e:
+        return visitor.render()
+    except (SyntaxError, ValueError, RecursionError) as e:
         return f"Error parsing script: {e}"
 
 # NEW: Git diff detection functions
@@ -334,59 +569,110 @@ def get_changed_files(path, base_ref="HEAD"):
     except (subprocess.CalledProcessError, FileNotFoundError):
         return None
 
+def _walk_project(path, spec=None):
+    """Yield (rel_prefix, entries) per directory via a scandir DFS
+
+    Shared by the summary walkers: DirEntry classification comes from the
+    directory read itself with no extra stat calls, relative prefixes are
+    extended incrementally instead of recomputed with relpath, and hidden
+    or gitignored directories are pruned before descending.
+    """
+    match = _spec_matcher(spec) if spec else None
+    stack = [(path, '')]
+    while stack:
+        dir_path, prefix = stack.pop()
+        try:
+            with os.scandir(dir_path) as it:
+                entries = list(it)
+        except OSError:
+            continue
+        files = []
+        for entry in entries:
+            name = entry.name
+            if name.startswith('.'):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                dir_key = prefix + name + '/'
+                if match and match(dir_key):
+                    continue
+                stack.append((entry.path, dir_key))
+            elif not (match and match(prefix + name)):
+                files.append(entry)
+        yield prefix, files
+
 # NEW: Entry point detection functions
-def detect_entry_points(path):
+def detect_entry_points(path, spec=None):
     """Detect entry point files in the project"""
     entry_points = []
-    
-    for root, dirs, files in os.walk(path):
-        # Skip hidden directories
-        dirs[:] = [d for d in dirs if not d.startswith('.')]
-        
-        for file in files:
+
+    for prefix, files in _walk_project(path, spec):
+        for entry in files:
             # Check against entry point patterns
             for lang, patterns in ENTRY_POINT_PATTERNS.items():
-                if file in patterns:
-                    rel_path = os.path.relpath(os.path.join(root, file), path)
+                if entry.name in patterns:
                     entry_points.append({
-                        'file': rel_path,
+                        'file': prefix + entry.name,
                         'language': lang,
-                        'full_path': os.path.join(root, file)
+                        'full_path': entry.path
                     })
-    
+
     return entry_points
 
-def scan_project_structure(path):
+def scan_project_structure(path, spec=None):
     """Scan and summarize project structure"""
     structure = {
         'directories': [],
         'file_types': {},
         'total_files': 0
     }
-    
-    for root, dirs, files in os.walk(path):
-        # Skip hidden directories
-        dirs[:] = [d for d in dirs if not d.startswith('.')]
-        
-        rel_dir = os.path.relpath(root, path)
-        if rel_dir != '.':
-            structure['directories'].append(rel_dir)
-        
-        for file in files:
+
+    for prefix, files in _walk_project(path, spec):
+        if prefix:
+            structure['directories'].append(prefix.rstrip('/'))
+
+        for entry in files:
             structure['total_files'] += 1
-            ext = os.path.splitext(file)[1]
+            ext = os.path.splitext(entry.name)[1]
             if ext:
                 structure['file_types'][ext] = structure['file_types'].get(ext, 0) + 1
-    
+
     return structure
     
 # 1. Helper to read .gitignore so we don't upload garbage
+# Cached: compiling a PathSpec isn't free and batch runs hit the same path
+# repeatedly. Opening directly instead of exists()+open saves a stat call.
+@functools.lru_cache(maxsize=32)
 def get_gitignore_spec(path):
     gitignore_path = os.path.join(path, '.gitignore')
-    if os.path.exists(gitignore_path):
-         with open(gitignore_path, 'r') as f:
+    try:
+        with open(gitignore_path, 'r') as f:
+            import pathspec
             return pathspec.PathSpec.from_lines('gitwildmatch', f)
-    return None
+    except FileNotFoundError:
+        return None
+
+def _spec_matcher(spec):
+    """Return the fastest ignore test for a compiled PathSpec
+
+    A negation-free .gitignore (the common case) reduces to "does any
+    pattern match", which one alternation regex answers in a single
+    C-level search instead of pathspec's Python loop over patterns.
+    Last-match-wins ordering only matters once a '!' pattern can overturn
+    an earlier match, so specs containing one fall back to pathspec's own
+    matcher.
+    """
+    patterns = [p for p in spec.patterns if p.regex is not None]
+    if patterns and all(p.include for p in patterns):
+        # Every gitwildmatch regex names its directory-marker group ps_d, so
+        # joining two verbatim would redefine the group; rewrite named groups
+        # to plain ones before combining
+        unnamed = (re.sub(r'\(\?P<[^>]+>', '(?:', p.regex.pattern) for p in patterns)
+        joined = "|".join(f"(?:{pattern})" for pattern in unnamed)
+        try:
+            return re.compile(joined).search
+        except re.error:
+            pass
+    return spec.match_file
 
 # 2. The Ingestion Logic
 def ingest_directory(root_path, spec, include_comments=False, files_to_process=None):
@@ -399,101 +685,335 @@ def ingest_directory(root_path, spec, include_comments=False, files_to_process=N
         include_comments: Whether to include comments in parsing
         files_to_process: Optional list of specific files to process (for incremental mode)
     """
-    project_context = ""
-    
-    # Walk the directory
-    for root, dirs, files in os.walk(root_path):
-        # Remove hidden directories (like .git)
-        dirs[:] = [d for d in dirs if not d.startswith('.')]
-        
-        for file in files:
-            file_path = os.path.join(root, file)
-            rel_path = os.path.relpath(file_path, root_path)
-            
+    # Explicit scandir DFS: DirEntry already carries the file type from the
+    # directory read, relative paths are extended incrementally instead of
+    # recomputed per file, and ignored directories are pruned before
+    # descending so their whole subtree is never touched
+    # Each stack frame carries the ignore matchers in effect for that
+    # directory as (rel_prefix_len, matcher) pairs: nested .gitignore files
+    # match against paths relative to their own directory
+    tasks = []
+    stack = [(root_path, "", ((0, _spec_matcher(spec)),) if spec else ())]
+    while stack:
+        dir_path, rel_dir, specs = stack.pop()
+        try:
+            with os.scandir(dir_path) as it:
+                entries = list(it)
+        except OSError:
+            continue
+
+        # The directory read we just did also tells us whether this dir has
+        # its own .gitignore - no extra stat probe per directory
+        for entry in entries:
+            if entry.name == '.gitignore' and entry.is_file(follow_symlinks=False):
+                try:
+                    with open(entry.path, 'r') as f:
+                        import pathspec
+                        local_spec = pathspec.PathSpec.from_lines('gitwildmatch', f)
+                    specs = specs + ((len(rel_dir), _spec_matcher(local_spec)),)
+                except OSError:
+                    pass
+                break
+
+        for entry in entries:
+            file = entry.name
+            rel_path = rel_dir + file
+
+            if entry.is_dir(follow_symlinks=False):
+                # Skip hidden directories (like .git) and whole ignored
+                # subtrees (node_modules, venv, etc.)
+                if file.startswith('.'):
+                    continue
+                dir_key = rel_path + '/'
+                if any(match(dir_key[base:]) for base, match in specs):
+                    continue
+                stack.append((entry.path, dir_key, specs))
+                continue
+
             # If specific files are provided, only process those
             if files_to_process is not None:
                 if rel_path not in files_to_process and rel_path.replace('\\', '/') not in files_to_process:
                     continue
-            
-            # Skip ignored files (node_modules, venv, etc.)
-            if spec and spec.match_file(rel_path):
+
+            # Skip ignored files
+            if any(match(rel_path[base:]) for base, match in specs):
                 continue
-                
+
             # Only read specific extensions to save tokens
             if file.endswith(('.js', '.ts', '.java')):
+                # mtime keys the preview index; the DirEntry stat is cached
+                # from the directory read where the OS provides it
                 try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                        # TRUNCATION STRATEGY: 
-                        # For a simple version, we limit chars per file to avoid token overflow
-                        # A better version would use AST to extract class names only.
-                        preview = content[:2000] 
-                        project_context += f"\n--- FILE: {rel_path} ---\n{preview}\n"
-                except Exception:
-                    continue # Skip binary files
+                    mtime_ns = entry.stat(follow_symlinks=False).st_mtime_ns
+                except OSError:
+                    continue
+                tasks.append((rel_path, entry.path, 'preview', include_comments, mtime_ns))
             elif file.endswith('.py'):
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    
-                    # --- NEW LOGIC START ---
-                    # Instead of sending raw content, we parse the structure
-                    skeleton = parse_pipeline_script(content, include_comments=include_comments)
-                    project_context += f"\n--- PIPELINE: {rel_path} ---\n{skeleton}\n"
-                    # --- NEW LOGIC END ---
-                    
-    return project_context
+                tasks.append((rel_path, entry.path, 'py', include_comments, 0))
+
+    if not tasks:
+        return ""
+
+    # Preview heads rarely change between runs: serve unchanged files from
+    # the content index instead of re-reading them
+    preview_index = None
+    if any(task[2] == 'preview' for task in tasks):
+        preview_index = cache.load_preview_index()
+
+    pieces = [None] * len(tasks)
+    pending = []
+    for slot, task in enumerate(tasks):
+        rel_path, file_path, kind, _, mtime_ns = task
+        if kind == 'preview':
+            record = preview_index['files'].get(file_path)
+            if record and record['mtime_ns'] == mtime_ns:
+                snippet = preview_index['snippets'].get(record['sha'])
+                if snippet is not None:
+                    pieces[slot] = f"\n--- FILE: {rel_path} ---\n{snippet}\n"
+                    continue
+        pending.append((slot, task))
+
+    # Parsing is CPU-bound Python work, so fan the collected files out to a
+    # process pool; map preserves walk order so the output is unchanged.
+    # Below ~32 files the pool startup costs more than it saves.
+    if pending:
+        if len(pending) < 32:
+            results = [_ingest_worker(task) for _, task in pending]
+        else:
+            with ProcessPoolExecutor() as pool:
+                results = list(pool.map(_ingest_worker, [task for _, task in pending], chunksize=16))
+
+        index_dirty = False
+        for (slot, task), result in zip(pending, results):
+            rel_path, file_path, kind, _, mtime_ns = task
+            if kind == 'preview' and result is not None:
+                pieces[slot] = f"\n--- FILE: {rel_path} ---\n{result}\n"
+                # Snippets are stored by content hash, so identical
+                # boilerplate files across paths share one entry
+                sha = hashlib.sha1(result.encode('utf-8')).hexdigest()
+                preview_index['files'][file_path] = {'mtime_ns': mtime_ns, 'sha': sha}
+                preview_index['snippets'][sha] = result
+                index_dirty = True
+            else:
+                pieces[slot] = result
+        if index_dirty:
+            cache.save_preview_index(preview_index)
+
+    return "".join(piece for piece in pieces if piece)
+
+
+# Non-Python files above this size are invariably bundles or generated
+# output; their first 2000 chars carry no architectural signal
+_PREVIEW_MAX_BYTES = 1_000_000
+
+
+def _ingest_worker(task):
+    """
+    Read and render one collected file. Python files come back as a full
+    context block; previews come back as the raw head text so the caller
+    can index them by content and attach the header itself.
+    """
+    rel_path, file_path, kind, include_comments, _mtime_ns = task
+
+    if kind == 'py':
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                content = f.read()
+        except (OSError, UnicodeDecodeError):
+            return None
+
+        # --- NEW LOGIC START ---
+        # Instead of sending raw content, we parse the structure.
+        # The cache keys on the exact content, so unchanged files
+        # skip the parse + visit entirely on warm runs.
+        skeleton = cache.get_or_parse(
+            content,
+            lambda: parse_pipeline_script(content, include_comments=include_comments, filename=rel_path),
+            variant="comments" if include_comments else ""
+        )
+        return f"\n--- PIPELINE: {rel_path} ---\n{skeleton}\n"
+        # --- NEW LOGIC END ---
+
+    try:
+        # TRUNCATION STRATEGY:
+        # For a simple version, we limit chars per file to avoid token overflow
+        # A better version would use AST to extract class names only.
+        # Only the head is ever shown, so mmap large files and fault in just
+        # the first pages instead of reading the whole file into a str; small
+        # files aren't worth the mapping overhead. Anything past the size
+        # cap is a bundle or generated artifact whose head is noise anyway.
+        size = os.path.getsize(file_path)
+        if size > _PREVIEW_MAX_BYTES:
+            return None
+        if size > 4096:
+            with open(file_path, 'rb') as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                head = mm[:2000]
+        else:
+            with open(file_path, 'rb') as fh:
+                head = fh.read(2000)
+        if b'\x00' in head:
+            return None # Skip binary files
+        return head.decode('utf-8', 'ignore')
+    except (OSError, ValueError):
+        return None # Skip unreadable files
 
 def ingest_entry_points_and_structure(root_path, spec, include_comments=False):
     """
     Ingest only entry points and project structure for new projects
     """
-    context = ""
-    
+    # Collect pieces and join once at the end - repeated += on a string
+    # recopies the whole buffer every time
+    parts = []
+
     # 1. Scan project structure
-    structure = scan_project_structure(root_path)
-    context += "="*80 + "\n"
-    context += "PROJECT STRUCTURE OVERVIEW\n"
-    context += "="*80 + "\n"
-    context += f"Total Files: {structure['total_files']}\n"
-    context += f"Total Directories: {len(structure['directories'])}\n\n"
-    context += "File Types Distribution:\n"
+    structure = scan_project_structure(root_path, spec)
+    parts.append("="*80 + "\n")
+    parts.append("PROJECT STRUCTURE OVERVIEW\n")
+    parts.append("="*80 + "\n")
+    parts.append(f"Total Files: {structure['total_files']}\n")
+    parts.append(f"Total Directories: {len(structure['directories'])}\n\n")
+    parts.append("File Types Distribution:\n")
     for ext, count in sorted(structure['file_types'].items(), key=lambda x: x[1], reverse=True):
-        context += f"  {ext}: {count} files\n"
-    context += "\n"
-    context += "Directory Structure:\n"
+        parts.append(f"  {ext}: {count} files\n")
+    parts.append("\n")
+    parts.append("Directory Structure:\n")
     for dir_path in sorted(structure['directories'])[:20]:  # Limit to first 20 dirs
-        context += f"  📁 {dir_path}\n"
-    context += "\n"
-    
+        parts.append(f"  📁 {dir_path}\n")
+    parts.append("\n")
+
     # 2. Detect and parse entry points
-    entry_points = detect_entry_points(root_path)
-    context += "="*80 + "\n"
-    context += "DETECTED ENTRY POINTS\n"
-    context += "="*80 + "\n"
-    
+    entry_points = detect_entry_points(root_path, spec)
+    parts.append("="*80 + "\n")
+    parts.append("DETECTED ENTRY POINTS\n")
+    parts.append("="*80 + "\n")
+
     if entry_points:
         for ep in entry_points:
-            context += f"\n🎯 Entry Point: {ep['file']} ({ep['language']})\n"
-            context += "-"*80 + "\n"
-            
+            parts.append(f"\n🎯 Entry Point: {ep['file']} ({ep['language']})\n")
+            parts.append("-"*80 + "\n")
+
             # Parse the entry point file
             try:
                 with open(ep['full_path'], 'r', encoding='utf-8') as f:
                     content = f.read()
-                    
+
                 if ep['file'].endswith('.py'):
-                    skeleton = parse_pipeline_script(content, include_comments=include_comments)
-                    context += skeleton + "\n"
+                    skeleton = cache.get_or_parse(
+                        content,
+                        lambda: parse_pipeline_script(content, include_comments=include_comments, filename=ep['file']),
+                        variant="comments" if include_comments else ""
+                    )
+                    parts.append(skeleton + "\n")
                 else:
                     # For non-Python files, show preview
                     preview = content[:2000]
-                    context += preview + "\n"
+                    parts.append(preview + "\n")
             except Exception as e:
-                context += f"Error reading file: {e}\n"
+                parts.append(f"Error reading file: {e}\n")
     else:
-        context += "No standard entry points detected.\n"
+        parts.append("No standard entry points detected.\n")
+
+    return "".join(parts)
+
+_FENCE_RE = re.compile(r"```(?:mermaid)?")
+
+# Static instruction block sent as the system message. Keeping it
+# byte-stable across runs lets the provider's prompt-prefix cache hit on
+# it; only the per-project trace travels in the user message.
+SYSTEM_PROMPT = """
+    You are a Technical Documentation Specialist creating adoption-friendly pipeline documentation.
+    
+    GOAL: Generate a concise Mermaid flowchart showing WHAT the pipeline does and WHAT configuration it uses.
+    Focus on extracting ACTUAL configuration values from the code, not generic descriptions.
+    
+    METADATA USAGE (IMPORTANT - Use these to enhance the diagram):
+    - If Pipeline Name is provided, MUST use it as the diagram title using: title(Pipeline Name)
+    - If Purpose is provided, MUST add it as an annotation below the title: purpose[Purpose: description]
+    - If Data Type is provided, MUST reference it in the first ingestion node (e.g., "Type: PDF documents")
+    - If Data Source is provided, MUST label it in the first ingestion node (e.g., "Source: GCS bucket")
+    - If Use Case is provided, MUST add context to the final output/destination nodes (e.g., "Use: RAG system")
+    - If Owner is provided, MUST add it as a note: note[Owner: Team Name]
+    - Connect title/purpose/note nodes to the main flow or group them at the top
+    
+    CRITICAL EXTRACTION RULES:
+    1. **Look for LITERAL VALUES in the code trace**:
+       - chunk_size=1000 → Use "1000", NOT "Default"
+       - model="text-embedding-3-small" → Use exact model name
+       - If you see a number or string literal, EXTRACT IT
+    
+    2. **For Config/Environment Variables - SHOW THE KEY NAME**:
+       - os.getenv("BUCKET_NAME") → Use key: "BUCKET_NAME" (not {{BUCKET_NAME}})
+       - Config.fetch("embedding-model") → Use key: "embedding-model"
+       - os.environ["API_KEY"] → Use key: "API_KEY"
+       - Format: "Config: embedding-model" or "Env: BUCKET_NAME"
+       - This helps users know WHICH config to set
+    
+    3. **For Method Calls**:
+       - RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+         → Extract: "Size: 1000, Overlap: 200"
+       - OpenAIEmbeddings(model="text-embedding-3-small")
+         → Extract: "Model: text-embedding-3-small"
+       - If model comes from config: "Model: Config[embedding-model]"
+    
+    EXTRACTION TARGETS:
+    - **Chunking**: Method class name, chunk_size (number), chunk_overlap (number)
+    - **Embeddings**: Exact model name string, API service (OpenAI/Cohere/etc)
+    - **Source**: Bucket names, file paths, collection names, API endpoints
+    - **Cache/Intermediate Storage**: 
+      * File format (.pkl/.json/.parquet) - MUST extract the actual filename if present
+      * For .pkl files: Specify the data structure (e.g., "Dict[doc_id: embedding]", "List[LangChain Documents]")
+      * Look for pickle.dump(), pickle.load(), or file write operations
+      * Include the variable name being saved (e.g., "embeddings.pkl stores: doc_embeddings_dict")
+    - **Vector DB**: 
+      * Service name (Pinecone/Turbopuffer/Weaviate/etc)
+      * Namespace name (extract the actual string value or config key, e.g., "production-docs" or "Config[INDEX_NAME]")
+      * Index name if different from namespace
+      * Alias name if used (e.g., for Turbopuffer alias or Pinecone index alias)
+      * Look for upsert() calls and their namespace/alias parameters
+    - **Document Storage (Firestore/MongoDB/etc)**:
+      * Database/Collection name
+      * Document structure or key fields being stored
+      * Any alias or reference names used
+      * Look for .set(), .add(), .update() operations
     
-    return context
+    OUTPUT FORMAT:
+    - Use `flowchart TD`
+    - Each node: 2-3 bullet points MAX using bullet character (•)
+    - Format bullets with <br/> for line breaks: "• Item 1<br/>• Item 2<br/>• Item 3"
+    - ALL nodes must be connected in a logical flow
+    - Use cylinder shapes `[(Name)]` for databases/storage
+    - Group related steps in subgraphs with descriptive names (e.g., Step1_Ingestion, Step2_Chunking)
+    - If metadata is provided, include title/purpose/owner nodes at the top
+    
+    EXAMPLE (GOOD):
+    ```
+    subgraph Step2_Chunking
+        C["• Method: RecursiveCharacterTextSplitter<br/>• Size: 1000 tokens, Overlap: 200<br/>• Splits by: Paragraph headers"]
+    end
+    
+    subgraph Step3_Embedding
+        D["• Model: text-embedding-3-small<br/>• Service: OpenAI API<br/>• Cache: embeddings.pkl"]
+        E[(GCS Bucket)]
+    end
+    
+    C --> D
+    D --> E
+    ```
+    
+    EXAMPLE (BAD - Don't do this):
+    ```
+    C["• Method: Default<br/>• Config: Default"]  ❌ Too vague!
+    D["• Model: {{MODEL_NAME}}"]  ❌ Should extract actual model if in code!
+    ```
+    
+    FLOW RULES:
+    - Every node must connect to at least one other node
+    - Show linear progression: Ingestion → Chunking → Embedding → Storage
+    - Side branches (logging, alerts) should connect back to main flow
+    - No orphaned nodes
+
+    Output ONLY the mermaid code. Extract ACTUAL values, not placeholders.
+    """
 
 # 3. The Command
 @app.command()
@@ -578,154 +1098,82 @@ def main(
     # Save intermediate AST parsing results if debug flag is enabled
     if debug:
         debug_file = "ast_debug_output.txt"
-        with open(debug_file, "w", encoding="utf-8") as f:
-            f.write("="*80 + "\n")
-            f.write("INTERMEDIATE AST PARSING RESULTS\n")
-            f.write("="*80 + "\n\n")
-            f.write(f"Total context size: {len(context)} characters\n")
-            f.write(f"Source directory: {path}\n\n")
-            f.write("="*80 + "\n")
-            f.write("PARSED CONTENT (sent to LLM):\n")
-            f.write("="*80 + "\n\n")
-            f.write(context)
-            f.write("\n\n" + "="*80 + "\n")
-            f.write("END OF AST PARSING RESULTS\n")
-            f.write("="*80 + "\n")
+        banner = "=" * 80
+        Path(debug_file).write_text(
+            f"{banner}\n"
+            "INTERMEDIATE AST PARSING RESULTS\n"
+            f"{banner}\n\n"
+            f"Total context size: {len(context)} characters\n"
+            f"Source directory: {path}\n\n"
+            f"{banner}\n"
+            "PARSED CONTENT (sent to LLM):\n"
+            f"{banner}\n\n"
+            f"{context}\n\n"
+            f"{banner}\n"
+            "END OF AST PARSING RESULTS\n"
+            f"{banner}\n",
+            encoding="utf-8",
+        )
         print(f"📝 Debug mode: AST parsing results saved to '{debug_file}'")
 
+    # Deferred: openai drags in pydantic and httpx, none of which a
+    # parse-only or debug run needs at startup
+    import openai
+
     client = openai.OpenAI(
             api_key=api_key,
-            base_url=FUEL_PROXY_URL
+            base_url=FUEL_PROXY_URL,
+            http_client=_http_client()
         )
     
     # Build metadata section if any optional info is provided
     metadata_section = ""
     if any([pipeline_name, pipeline_purpose, data_type, data_source, use_case, team_owner]):
-        metadata_section = "\n    PIPELINE METADATA (Use this context to enhance the diagram):\n"
+        meta_parts = ["\n    PIPELINE METADATA (Use this context to enhance the diagram):\n"]
         if pipeline_name:
-            metadata_section += f"    - Pipeline Name: {pipeline_name}\n"
+            meta_parts.append(f"    - Pipeline Name: {pipeline_name}\n")
         if pipeline_purpose:
-            metadata_section += f"    - Purpose: {pipeline_purpose}\n"
+            meta_parts.append(f"    - Purpose: {pipeline_purpose}\n")
         if data_type:
-            metadata_section += f"    - Data Type: {data_type}\n"
+            meta_parts.append(f"    - Data Type: {data_type}\n")
         if data_source:
-            metadata_section += f"    - Data Source: {data_source}\n"
+            meta_parts.append(f"    - Data Source: {data_source}\n")
         if use_case:
-            metadata_section += f"    - Use Case: {use_case}\n"
+            meta_parts.append(f"    - Use Case: {use_case}\n")
         if team_owner:
-            metadata_section += f"    - Owner: {team_owner}\n"
-    
-    prompt = f"""
-    You are a Technical Documentation Specialist creating adoption-friendly pipeline documentation.
-    {metadata_section}
-    
-    GOAL: Generate a concise Mermaid flowchart showing WHAT the pipeline does and WHAT configuration it uses.
-    Focus on extracting ACTUAL configuration values from the code, not generic descriptions.
-    
-    METADATA USAGE (IMPORTANT - Use these to enhance the diagram):
-    - If Pipeline Name is provided, MUST use it as the diagram title using: title(Pipeline Name)
-    - If Purpose is provided, MUST add it as an annotation below the title: purpose[Purpose: description]
-    - If Data Type is provided, MUST reference it in the first ingestion node (e.g., "Type: PDF documents")
-    - If Data Source is provided, MUST label it in the first ingestion node (e.g., "Source: GCS bucket")
-    - If Use Case is provided, MUST add context to the final output/destination nodes (e.g., "Use: RAG system")
-    - If Owner is provided, MUST add it as a note: note[Owner: Team Name]
-    - Connect title/purpose/note nodes to the main flow or group them at the top
-    
-    CRITICAL EXTRACTION RULES:
-    1. **Look for LITERAL VALUES in the code trace**:
-       - chunk_size=1000 → Use "1000", NOT "Default"
-       - model="text-embedding-3-small" → Use exact model name
-       - If you see a number or string literal, EXTRACT IT
-    
-    2. **For Config/Environment Variables - SHOW THE KEY NAME**:
-       - os.getenv("BUCKET_NAME") → Use key: "BUCKET_NAME" (not {{{{BUCKET_NAME}}}})
-       - Config.fetch("embedding-model") → Use key: "embedding-model"
-       - os.environ["API_KEY"] → Use key: "API_KEY"
-       - Format: "Config: embedding-model" or "Env: BUCKET_NAME"
-       - This helps users know WHICH config to set
-    
-    3. **For Method Calls**:
-       - RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-         → Extract: "Size: 1000, Overlap: 200"
-       - OpenAIEmbeddings(model="text-embedding-3-small")
-         → Extract: "Model: text-embedding-3-small"
-       - If model comes from config: "Model: Config[embedding-model]"
-    
-    EXTRACTION TARGETS:
-    - **Chunking**: Method class name, chunk_size (number), chunk_overlap (number)
-    - **Embeddings**: Exact model name string, API service (OpenAI/Cohere/etc)
-    - **Source**: Bucket names, file paths, collection names, API endpoints
-    - **Cache/Intermediate Storage**: 
-      * File format (.pkl/.json/.parquet) - MUST extract the actual filename if present
-      * For .pkl files: Specify the data structure (e.g., "Dict[doc_id: embedding]", "List[LangChain Documents]")
-      * Look for pickle.dump(), pickle.load(), or file write operations
-      * Include the variable name being saved (e.g., "embeddings.pkl stores: doc_embeddings_dict")
-    - **Vector DB**: 
-      * Service name (Pinecone/Turbopuffer/Weaviate/etc)
-      * Namespace name (extract the actual string value or config key, e.g., "production-docs" or "Config[INDEX_NAME]")
-      * Index name if different from namespace
-      * Alias name if used (e.g., for Turbopuffer alias or Pinecone index alias)
-      * Look for upsert() calls and their namespace/alias parameters
-    - **Document Storage (Firestore/MongoDB/etc)**:
-      * Database/Collection name
-      * Document structure or key fields being stored
-      * Any alias or reference names used
-      * Look for .set(), .add(), .update() operations
-    
-    OUTPUT FORMAT:
-    - Use `flowchart TD`
-    - Each node: 2-3 bullet points MAX using bullet character (•)
-    - Format bullets with <br/> for line breaks: "• Item 1<br/>• Item 2<br/>• Item 3"
-    - ALL nodes must be connected in a logical flow
-    - Use cylinder shapes `[(Name)]` for databases/storage
-    - Group related steps in subgraphs with descriptive names (e.g., Step1_Ingestion, Step2_Chunking)
-    - If metadata is provided, include title/purpose/owner nodes at the top
-    
-    EXAMPLE (GOOD):
-    ```
-    subgraph Step2_Chunking
-        C["• Method: RecursiveCharacterTextSplitter<br/>• Size: 1000 tokens, Overlap: 200<br/>• Splits by: Paragraph headers"]
-    end
-    
-    subgraph Step3_Embedding
-        D["• Model: text-embedding-3-small<br/>• Service: OpenAI API<br/>• Cache: embeddings.pkl"]
-        E[(GCS Bucket)]
-    end
-    
-    C --> D
-    D --> E
-    ```
-    
-    EXAMPLE (BAD - Don't do this):
-    ```
-    C["• Method: Default<br/>• Config: Default"]  ❌ Too vague!
-    D["• Model: {{{{MODEL_NAME}}}}"]  ❌ Should extract actual model if in code!
-    ```
-    
-    FLOW RULES:
-    - Every node must connect to at least one other node
-    - Show linear progression: Ingestion → Chunking → Embedding → Storage
-    - Side branches (logging, alerts) should connect back to main flow
-    - No orphaned nodes
+            meta_parts.append(f"    - Owner: {team_owner}\n")
+        metadata_section = "".join(meta_parts)
     
+    user_message = f"""{metadata_section}
     THE PARSED CODE TRACE:
     {context}
-    
-    Output ONLY the mermaid code. Extract ACTUAL values, not placeholders.
     """
 
-    response = client.chat.completions.create(
+    # Stream the completion so we start collecting tokens at first-token
+    # latency instead of blocking on the whole generation
+    stream = client.chat.completions.create(
         model="gpt-4o",
-        messages=[{"role": "user", "content": prompt}],
+        messages=[
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": user_message},
+        ],
         temperature=0,
-        seed=42
+        seed=42,
+        stream=True
     )
-    
-    # Clean the response
-    diagram_code = response.choices[0].message.content
-    diagram_code = diagram_code.replace("```mermaid", "").replace("```", "")
-    # Remove any problematic Unicode characters
-    diagram_code = diagram_code.encode('ascii', 'ignore').decode('ascii')
+
+    chunks = []
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            chunks.append(chunk.choices[0].delta.content)
+
+    # Clean the response: one pass strips both fence spellings
+    diagram_code = "".join(chunks)
+    diagram_code = _FENCE_RE.sub("", diagram_code)
+    # Remove any problematic Unicode characters. isascii() is a single C
+    # scan, so the common all-ASCII response skips both copies entirely.
+    if not diagram_code.isascii():
+        diagram_code = diagram_code.encode('ascii', 'ignore').decode('ascii')
     
     # Save to a local HTML file so user can view it immediately
     html_content = f"""<!DOCTYPE html>
@@ -746,9 +1194,16 @@ def main(
 </html>
 """
     
-    with open("diagram.html", "w", encoding="utf-8") as f:
-        f.write(html_content)
-        
+    # Single unbuffered write into a temp file, then an atomic rename:
+    # the browser (and incremental mode) never sees a partial diagram.html
+    tmp_path = f"diagram.html.tmp.{os.getpid()}"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        os.write(fd, html_content.encode('utf-8'))
+    finally:
+        os.close(fd)
+    os.replace(tmp_path, "diagram.html")
+
     print("✅ Diagram generated! Open 'diagram.html' in your browser.")
     
     # Optional: Automatically open it